@@ -1,23 +1,156 @@
+import datetime
+import functools
+import hashlib
+import json
+import textwrap
+import threading
+import time
+from collections import OrderedDict
+
 import google.generativeai as genai
+from google.generativeai import caching
+from google.api_core.client_options import ClientOptions
+from google.api_core.exceptions import InvalidArgument
 from config import Config
 
 
+# Share of the context window that interpolated data (CSV content,
+# summaries) may use; the rest is left for instructions and the answer
+DATA_BUDGET_FRACTION = 0.6
+
+# Request-specific prompt tails, filled with str.format_map. They follow the
+# static per-prompt prefixes defined on AIManager.
+SQL_SCHEMA_TMPL = "\nSchema:\n{schema}\n"
+
+SQL_EXPLAIN_QUESTION_TMPL = """
+Permission rule: {role}
+
+Write the explanation in {language}.
+Natural language query: "{q}"
+JSON:
+"""
+
+CSV_ANALYSIS_PROMPT_TMPL = """
+CSV Information: {summaries}
+
+Respond in {language}.
+Answer:
+"""
+
+CSV_QUERY_PROMPT_TMPL = """
+CSV datasets:
+{csv_data}
+
+Respond in {language}.
+The user asked: "{q}"
+Answer:
+"""
+
+CSV_BATCH_PROMPT_TMPL = """
+CSV datasets:
+{csv_data}
+
+Respond in {language}.
+The user asked the following questions:
+{questions}
+Answers (JSON list):
+"""
+
+INSIGHTS_PROMPT_TMPL = """
+Dataset Summary: {summary}
+
+Respond in {language}.
+Key Strategic Insights:
+1. 
+"""
+
+
+def _normalize_question(question):
+    """Canonical form of a user question used for de-duplication."""
+    return " ".join(str(question).split()).casefold()
+
+
+def schema_fingerprint(schema):
+    """8-byte BLAKE2b fingerprint of a schema string, used in cache keys."""
+    return hashlib.blake2b(schema.encode("utf-8"), digest_size=8).digest()
+
+
+def _fingerprint(data):
+    """Short stable hash of arbitrary prompt data (dicts, strings)."""
+    return hashlib.sha256(str(data).encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=8)
+def _schema_prefix(system_prefix, schema):
+    """Static instructions + schema as one string, built once per schema."""
+    return system_prefix + SQL_SCHEMA_TMPL.format_map({"schema": schema})
+
+
+_MODEL = None
+_MODEL_LOCK = threading.Lock()
+
+# Models bound to an explicit Gemini context cache, keyed by sha256 of the
+# cached prefix: key -> (model or None, expires_at monotonic seconds)
+_PREFIX_MODELS = OrderedDict()
+_PREFIX_MODELS_LOCK = threading.Lock()
+_PREFIX_MODELS_SIZE = 4
+
+
+def _get_model():
+    """Return the process-wide GenerativeModel, configuring the SDK on first use."""
+    global _MODEL
+    if _MODEL is None:
+        with _MODEL_LOCK:
+            if _MODEL is None:
+                config = Config()
+                # configure the Google generative AI SDK with the API key.
+                # The default grpc transport keeps one persistent HTTP/2
+                # channel (multiplexed, kept alive) for every call made
+                # through the shared model below.
+                options = {}
+                if config.GEMINI_API_ENDPOINT:
+                    options["client_options"] = ClientOptions(api_endpoint=config.GEMINI_API_ENDPOINT)
+                # Only override the transport when asked ('grpc' or 'rest');
+                # otherwise the SDK picks its own default
+                if config.GEMINI_TRANSPORT:
+                    options["transport"] = config.GEMINI_TRANSPORT
+                genai.configure(api_key=config.GEMINI_API_KEY, **options)
+                # model name can be changed via GEMINI_MODEL (works with SDK 0.8.6)
+                _MODEL = genai.GenerativeModel(config.GEMINI_MODEL)
+    return _MODEL
+
+
 def _safe_extract_text(response):
     """
     Extract text from a generative AI response object.
 
-    Different versions of the generative AI SDK may return different shapes
-    (objects, dicts, nested parts). This helper tries multiple common access
-    patterns and falls back to a stringified representation so the caller
-    always receives a string. This avoids errors like "response.text quick
-    accessor requires the response to contain a valid Part" when parts are
-    missing.
+    The configured SDK returns a response with a ``.text`` accessor, so that
+    is tried first, followed by the first candidate's first part. Only if
+    both fail do we fall back to the generic walker, which handles other
+    shapes (dicts, nested parts). This avoids errors like "response.text
+    quick accessor requires the response to contain a valid Part" when
+    parts are missing.
     """
+    # Fast path: the SDK's quick accessor
+    try:
+        text = response.text
+        if text is not None:
+            return str(text)
+    except Exception:
+        pass
+
+    # Second fast path: first candidate's first part
     try:
-        # If response is an object with .text property → return that.
-        if hasattr(response, "text") and response.text is not None:
-            return str(response.text)
+        return str(response.candidates[0].content.parts[0].text)
+    except Exception:
+        pass
+
+    return _extract_text_generic(response)
 
+
+def _extract_text_generic(response):
+    """Slow path for ``_safe_extract_text`` covering other response shapes."""
+    try:
         # Some SDKs return a simple dict-like structure
         if isinstance(response, dict):
             # If response is a dict → it may have keys like "candidates", "outputs", or "output".
@@ -70,6 +203,22 @@ def _safe_extract_text(response):
             return ""
 
 
+def _parse_json_text(text):
+    """Parse JSON returned by the model, tolerating a surrounding ```json fence."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return json.loads(text)
+
+
+def _is_too_large(error):
+    """True if an InvalidArgument error says the request exceeded the model's size limits."""
+    message = str(error).lower()
+    return any(word in message for word in ("token", "too large", "exceeds", "too long"))
+
+
 class AIManager:
     """Manager for interactions with the configured generative AI model.
 
@@ -77,140 +226,416 @@ class AIManager:
     Flask backend. The implementation uses defensive parsing so any SDK
     response shape is handled gracefully and useful error messages are
     propagated to the API consumer.
+
+    Every prompt starts with a static, variable-free prefix and ends with
+    the request-specific data, so repeated calls share a byte-identical
+    prefix that Gemini's implicit context caching can reuse.
     """
 
+    SQL_EXPLAIN_SYSTEM_PREFIX = textwrap.dedent("""\
+        You are an expert SQL generator and data analyst. Convert the natural language query given at the end
+        into a valid MySQL statement and explain in 2-3 sentences what data the statement returns or changes.
+
+        Rules:
+        - Ensure all table and column names are valid.
+        - Return a JSON object with exactly two string keys: "sql" and "explanation".
+        - Do not include markdown.
+        - Follow the permission rule given below.
+        """)
+
+    CSV_ANALYSIS_SYSTEM_PREFIX = textwrap.dedent("""\
+        You are a data analyst. Determine if the following CSV files are related in any way
+        (e.g., shared keys, similar columns, or logical relationships). Give a clear and short summary of your findings.
+        Answer in 3-4 lines.
+        """)
+
+    CSV_QUERY_SYSTEM_PREFIX = textwrap.dedent("""\
+        You are an intelligent data analyst.
+        Using reasoning on the CSV datasets below, answer the user's question clearly in 3-5 lines.
+        If the answer involves numerical or tabular output, include that in your text naturally.
+        """)
+
+    CSV_BATCH_SYSTEM_PREFIX = textwrap.dedent("""\
+        You are an intelligent data analyst.
+        Using reasoning on the CSV datasets below, answer each of the user's questions clearly in 3-5 lines.
+        Return answers as JSON list, one entry per question, in the same order.
+        Each entry must be a string. Do not include markdown.
+        """)
+
+    INSIGHTS_SYSTEM_PREFIX = textwrap.dedent("""\
+        You are a senior data scientist. Analyze the following summary of a CSV dataset and provide
+        5-7 high-level strategic insights, patterns, or anomalies discovered.
+        Include specific mention of outliers or unexpected distributions if present.
+        """)
+
     def __init__(self):
         # load configuration (API key, etc.)
         self.config = Config()
-        # configure the Google generative AI SDK with the API key
-        genai.configure(api_key=self.config.GEMINI_API_KEY)
-        # choose a model; this value can be updated via Config if needed
-        # Using gemini-pro-vision (works with SDK 0.8.6)
-        self.model = genai.GenerativeModel("gemini-pro")
-
-    def generate_sql_query(self, natural_language_query, schema, allow_destructive=False):
-        """Convert natural language query to a SQL statement using Gemini.
-        
-        If allow_destructive is True, the model is allowed to generate multi-line 
-        DML/DDL (DELETE, UPDATE, DROP, etc.) instead of just SELECT.
+        # One configured SDK client/model is shared by every AIManager so the
+        # underlying channel (and its TLS session) is reused across requests
+        self.model = _get_model()
+        # Exact-match response cache: sha256(prompt) -> extracted text.
+        # Bounded LRU so repeated questions skip the Gemini round-trip.
+        self._response_cache = OrderedDict()
+        self._response_cache_lock = threading.Lock()
+        self._response_cache_size = self.config.AI_CACHE_SIZE
+
+    def _cache_key(self, prompt, cache_key=None):
+        """Return the response-cache key for a prompt, or None to bypass the cache."""
+        if cache_key is False or self._response_cache_size <= 0:
+            return None
+        if cache_key is None:
+            if isinstance(prompt, (list, tuple)):
+                prompt = "".join(prompt)
+            return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return hashlib.sha256(repr(cache_key).encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key):
+        with self._response_cache_lock:
+            if key in self._response_cache:
+                self._response_cache.move_to_end(key)
+                return self._response_cache[key]
+        return None
+
+    def _cache_put(self, key, text):
+        with self._response_cache_lock:
+            self._response_cache[key] = text
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > self._response_cache_size:
+                self._response_cache.popitem(last=False)
+
+    def _cache_lookup(self, cache_key):
+        """Return the cached result for an explicit ``cache_key`` (None on a miss).
+
+        Lets callers skip building an expensive prompt when the answer is
+        already cached.
         """
-        role_instructions = "Only generate SELECT statements."
-        if allow_destructive:
-            role_instructions = "You are allowed to generate DML and DDL statements (SELECT, DELETE, UPDATE, DROP, ALTER) if the user request requires it."
-
-        sql_prompt = f"""
-You are an expert SQL generator. Convert the following natural language query into a valid MySQL statement.
-Schema:
-{schema}
-
-Rules:
-- {role_instructions}
-- Ensure all table and column names are valid.
-- Do not include explanations or markdown.
-
-Natural language query: "{natural_language_query}"
-SQL:
-"""
+        key = self._cache_key(None, cache_key)
+        return self._cache_get(key) if key is not None else None
+
+    def _cached_generate(self, prompt, cache_key=None, model=None, validate=None):
+        """Call the model for ``prompt``, serving repeats from an in-memory cache.
+
+        ``prompt`` is a string or a list of text parts (static prefix first).
+        The cache key defaults to the SHA256 of the fully-formatted prompt.
+        Callers may pass an explicit ``cache_key`` when a smaller tuple
+        identifies the request better (e.g. schema hash + question). Pass
+        ``cache_key=False`` to bypass the cache entirely. ``model`` overrides
+        the shared model (e.g. one bound to an explicit context cache).
+
+        ``validate`` turns the response text into the value to return and
+        raises if the response is unusable. Its result is what gets cached,
+        so a malformed or rejected answer is never stored and a retry of
+        the same request reaches the model again.
+        """
+        key = self._cache_key(prompt, cache_key)
+        if key is not None:
+            cached = self._cache_get(key)
+            if cached is not None:
+                return cached
+
+        result = _safe_extract_text((model or self.model).generate_content(prompt))
+        if validate is not None:
+            result = validate(result)
+
+        if key is not None:
+            self._cache_put(key, result)
+        return result
+
+    def _model_for_prefix(self, prefix):
+        """Return a model bound to an explicit Gemini context cache of ``prefix``.
+
+        Only used when AI_EXPLICIT_CACHE_TTL is set. Returns None when
+        explicit caching is disabled or unavailable (unsupported model,
+        prefix below the minimum cacheable size), in which case callers
+        send the full prompt. A schema change yields a new prefix and hence
+        a new cache; old ones expire server-side after their TTL.
+        """
+        ttl = self.config.AI_EXPLICIT_CACHE_TTL
+        if ttl <= 0:
+            return None
+
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        now = time.monotonic()
+        with _PREFIX_MODELS_LOCK:
+            entry = _PREFIX_MODELS.get(key)
+            if entry is not None and entry[1] > now:
+                _PREFIX_MODELS.move_to_end(key)
+                return entry[0]
 
         try:
-            # Ask the model to generate SQL. Different SDK versions return
-            # different shapes; we parse safely using _safe_extract_text.
-            response = self.model.generate_content(sql_prompt)
-            sql_query = _safe_extract_text(response).strip()
-
-            # Basic safety check
-            sql_lower = sql_query.lower().strip()
-            
-            if not allow_destructive:
-                if not sql_lower.startswith("select"):
-                    # Check if it's a DELETE or DROP query
-                    if sql_lower.startswith("delete") or sql_lower.startswith("drop"):
-                        raise ValueError("Deletion/Drop operations are restricted through the chat interface. Use the admin panel to delete tables. You may not have the required permissions.")
-                    else:
-                        raise ValueError("Unsafe or non-SELECT query generated. Only SELECT queries are allowed through the chat.")
-            else:
-                # For administrators, we allow destructive queries but still exclude very dangerous ones like 'drop database'
-                if "drop database" in sql_lower:
-                    raise ValueError("Database-level DROP operations are not allowed through this interface for safety reasons.")
-
-            return sql_query
+            cached = caching.CachedContent.create(
+                model=self.config.GEMINI_MODEL,
+                contents=[prefix],
+                ttl=datetime.timedelta(seconds=ttl)
+            )
+            model = genai.GenerativeModel.from_cached_content(cached_content=cached)
         except Exception as e:
-            # Provide a clear error message to the caller
-            raise Exception(f"SQL generation error: {str(e)}")
-
-    def generate_query_explanation(self, sql_query, results, language="English"):
-        """Generate a short explanation for a SQL query and its results in the specified language.
-
-        Returns a 2-3 sentence explanation string.
+            # Remember the failure for the TTL so we don't retry every call
+            print(f"Explicit context cache unavailable, sending full prompts: {e}")
+            model = None
+
+        with _PREFIX_MODELS_LOCK:
+            # Refresh a minute before the server-side cache expires
+            _PREFIX_MODELS[key] = (model, now + max(ttl - 60, ttl / 2))
+            _PREFIX_MODELS.move_to_end(key)
+            while len(_PREFIX_MODELS) > _PREFIX_MODELS_SIZE:
+                _PREFIX_MODELS.popitem(last=False)
+        return model
+
+    def _generate_with_prefix(self, prompt, cache_key, validate=None):
+        """Generate for a [prefix, suffix] prompt, using an explicit context cache for the prefix when enabled."""
+        model = self._model_for_prefix(prompt[0])
+        if model is not None:
+            return self._cached_generate(prompt[1:], cache_key=cache_key, model=model, validate=validate)
+        return self._cached_generate(prompt, cache_key=cache_key, validate=validate)
+
+    def _check_sql(self, sql_query, allow_destructive):
+        """Apply the basic safety rules to generated SQL and return it stripped."""
+        sql_query = sql_query.strip()
+        sql_lower = sql_query.lower()
+
+        if not allow_destructive:
+            if not sql_lower.startswith("select"):
+                # Check if it's a DELETE or DROP query
+                if sql_lower.startswith("delete") or sql_lower.startswith("drop"):
+                    raise ValueError("Deletion/Drop operations are restricted through the chat interface. Use the admin panel to delete tables. You may not have the required permissions.")
+                else:
+                    raise ValueError("Unsafe or non-SELECT query generated. Only SELECT queries are allowed through the chat.")
+        else:
+            # For administrators, we allow destructive queries but still exclude very dangerous ones like 'drop database'
+            if "drop database" in sql_lower:
+                raise ValueError("Database-level DROP operations are not allowed through this interface for safety reasons.")
+
+        return sql_query
+
+    def generate_sql_and_explanation(self, natural_language_query, schema, language="English", allow_destructive=False, schema_hash=None):
+        """Generate a SQL statement and its explanation with a single Gemini call.
+
+        Returns a ``(sql, explanation)`` tuple. The SQL goes through the
+        ``_check_sql`` safety checks. Non-destructive answers are
+        cached per (schema hash, normalized question, language), so a schema
+        change naturally misses the cache.
         """
-        summary_prompt = f"""
-You are a data analyst. Given the following SQL query and its result, write a short, clear explanation
-in 2-3 sentences about what this data represents.
-Respond in {language}.
+        role_instructions = "Only generate SELECT statements."
+        if allow_destructive:
+            role_instructions = "You are allowed to generate DML and DDL statements (SELECT, DELETE, UPDATE, DROP, ALTER) if the user request requires it."
 
-SQL Query: {sql_query}
-Query Result (sample of up to 5 rows): {results[:5]}
-Explanation:
-"""
+        prompt = [
+            _schema_prefix(self.SQL_EXPLAIN_SYSTEM_PREFIX, schema),
+            SQL_EXPLAIN_QUESTION_TMPL.format_map({"role": role_instructions, "language": language, "q": natural_language_query}),
+        ]
+
+        cache_key = False
+        if not allow_destructive:
+            if schema_hash is None:
+                schema_hash = schema_fingerprint(schema)
+            cache_key = ("sql_explain", schema_hash, _normalize_question(natural_language_query), language)
+
+        def parse(text):
+            # Runs before caching, so bad JSON or rejected SQL is never stored
+            parsed = _parse_json_text(text)
+            if not isinstance(parsed, dict) or not isinstance(parsed.get("sql"), str):
+                raise ValueError("Model did not return a JSON object with a 'sql' field")
+            sql_query = self._check_sql(parsed["sql"], allow_destructive)
+            return sql_query, str(parsed.get("explanation", "")).strip()
 
         try:
-            response = self.model.generate_content(summary_prompt)
-            return _safe_extract_text(response).strip()
+            return self._generate_with_prefix(prompt, cache_key, validate=parse)
         except Exception as e:
-            raise Exception(f"Explanation generation error: {str(e)}")
+            raise Exception(f"SQL generation error: {str(e)}")
 
     def analyze_csv_files(self, csv_data_summaries, language="English"):
         """Analyze CSV files and return a short relationship summary in the specified language."""
-        analysis_prompt = f"""
-You are a data analyst. Determine if the following CSV files are related in any way
-(e.g., shared keys, similar columns, or logical relationships). Give a clear and short summary of your findings.
-Respond in {language}.
-
-CSV Information: {csv_data_summaries}
-
-Answer in 3-4 lines:
-"""
+        analysis_prompt = [
+            self.CSV_ANALYSIS_SYSTEM_PREFIX,
+            CSV_ANALYSIS_PROMPT_TMPL.format_map({
+                "summaries": self._fit_to_budget(csv_data_summaries, self._data_budget()),
+                "language": language,
+            }),
+        ]
 
         try:
-            response = self.model.generate_content(analysis_prompt)
-            return _safe_extract_text(response).strip()
+            return self._cached_generate(analysis_prompt).strip()
         except Exception as e:
             raise Exception(f"CSV analysis error: {str(e)}")
 
     def query_csv_data(self, user_query, csv_data, language="English"):
         """Answer free-text questions about uploaded CSV data in the specified language."""
-        query_prompt = f"""
-You are an intelligent data analyst.
-You have access to the following CSV datasets:
-{csv_data}
+        return self._answer_one(user_query, self._budgeted(csv_data), _fingerprint(csv_data), language)
 
-The user asked: "{user_query}"
+    def _budgeted(self, csv_data):
+        """Return a function that fits ``csv_data`` to the data budget on first call.
 
-Using reasoning on these CSVs, answer clearly in 3-5 lines.
-Respond in {language}.
-If the answer involves numerical or tabular output, include that in your text naturally.
-"""
+        Fitting can cost several count_tokens round trips, so it is only
+        done once, and only when a prompt actually has to be sent.
+        """
+        fitted = []
+
+        def context():
+            if not fitted:
+                fitted.append(self._fit_to_budget(csv_data, self._data_budget()))
+            return fitted[0]
+        return context
+
+    def _answer_one(self, user_query, context, data_fingerprint, language):
+        """Answer one question against the CSV data.
+
+        ``context`` is the callable from ``_budgeted``; it is only called on
+        a cache miss. ``data_fingerprint`` identifies the untruncated CSV
+        data, so batch fallbacks and ``query_csv_data`` share cache entries.
+        """
+        # Key on the question as normalised text plus a fingerprint of the
+        # data, so rephrasings that differ only in case/spacing share a hit
+        cache_key = ("csv_query", data_fingerprint, _normalize_question(user_query), language)
+        cached = self._cache_lookup(cache_key)
+        if cached is not None:
+            return cached.strip()
+
+        query_prompt = [
+            self.CSV_QUERY_SYSTEM_PREFIX,
+            CSV_QUERY_PROMPT_TMPL.format_map({
+                "csv_data": context(),
+                "language": language,
+                "q": user_query,
+            }),
+        ]
 
         try:
-            response = self.model.generate_content(query_prompt)
-            return _safe_extract_text(response).strip()
+            return self._cached_generate(query_prompt, cache_key=cache_key).strip()
         except Exception as e:
             raise Exception(f"CSV query error: {str(e)}")
-    def generate_detailed_insights(self, csv_summaries, language="English"):
-        """Generate high-level strategic insights for the dataset."""
-        prompt = f"""
-You are a senior data scientist. Analyze the following summary of a CSV dataset and provide
-5-7 high-level strategic insights, patterns, or anomalies discovered.
-Respond in {language}.
-Include specific mention of outliers or unexpected distributions if present.
 
-Dataset Summary: {csv_summaries}
+    def _data_budget(self):
+        return int(self.config.AI_CONTEXT_TOKENS * DATA_BUDGET_FRACTION)
 
-Key Strategic Insights:
-1. 
-"""
+    def _count_tokens(self, prompt):
+        """Return the model's token count for ``prompt`` (0 if counting fails)."""
+        try:
+            return self.model.count_tokens(prompt).total_tokens
+        except Exception:
+            return 0
+
+    def _fit_to_budget(self, body, budget_tokens):
+        """Truncate ``body`` so it uses at most ``budget_tokens`` model tokens.
+
+        Bodies shorter than the budget in characters cannot exceed it and
+        skip token counting. Otherwise the cut point starts from a
+        proportional estimate and is refined by binary search with
+        ``count_tokens``; a note records how much was dropped.
+        """
+        body = str(body)
+        if len(body) <= budget_tokens:
+            return body
+
+        total = self._count_tokens(body)
+        if total <= budget_tokens:
+            return body
+
+        lo, hi = 0, len(body)
+        guess = int(len(body) * budget_tokens / total)
+        # A handful of count_tokens round-trips is enough to land close
+        for _ in range(6):
+            if self._count_tokens(body[:guess]) <= budget_tokens:
+                lo = guess
+            else:
+                hi = guess
+            if hi - lo <= max(1, len(body) // 100):
+                break
+            guess = (lo + hi) // 2
+
+        return body[:lo] + f"\n... [truncated {len(body) - lo} characters to fit the model context]"
+
+    def query_csv_data_batch(self, questions, csv_data, language="English", max_batch=20):
+        """Answer several questions about the CSV data using as few model calls as possible.
+
+        Questions are packed into one prompt (up to ``max_batch`` at a time)
+        and the model is asked for a JSON list with one answer per question.
+        If a batch does not fit the context window, is rejected as too large,
+        or returns a malformed/truncated list, the batch size is shrunk by 10%
+        and retried; other errors are raised. A single question is answered
+        on its own, reusing the already budgeted CSV context. Duplicate questions (after
+        normalising case and whitespace) are only sent once. Answers are
+        returned in the same order as ``questions``.
+        """
+        normalized = [_normalize_question(q) for q in questions]
+        originals = {}
+        for question, norm in zip(questions, normalized):
+            originals.setdefault(norm, question)
+        unique = list(originals)
+
+        answers = self._answer_unique_questions([originals[n] for n in unique], csv_data, language, max_batch)
+        by_question = dict(zip(unique, answers))
+        return [by_question[n] for n in normalized]
+
+    def _answer_unique_questions(self, questions, csv_data, language, max_batch):
+        answers = []
+        budget = self.config.AI_CONTEXT_TOKENS
+        # Budget the data at most once, and only if some batch misses the
+        # cache; single-question fallbacks reuse it
+        data_fingerprint = _fingerprint(csv_data)
+        context = self._budgeted(csv_data)
+        batch_size = max(1, min(max_batch, len(questions)))
+        i = 0
+
+        while i < len(questions):
+            batch = questions[i:i + batch_size]
+            if len(batch) == 1:
+                answers.append(self._answer_one(batch[0], context, data_fingerprint, language))
+                i += 1
+                continue
+
+            cache_key = ("csv_batch", data_fingerprint, tuple(_normalize_question(q) for q in batch), language)
+            cached = self._cache_lookup(cache_key)
+            if cached is not None:
+                answers.extend(cached)
+                i += len(batch)
+                continue
+
+            numbered = "\n".join(f"Q{n}: {q}" for n, q in enumerate(batch, start=1))
+            batch_prompt = [
+                self.CSV_BATCH_SYSTEM_PREFIX,
+                CSV_BATCH_PROMPT_TMPL.format_map({"csv_data": context(), "language": language, "questions": numbered}),
+            ]
+            if self._count_tokens(batch_prompt) > budget:
+                batch_size = max(1, int(batch_size * 0.9))
+                continue
+
+            def parse(text, expected=len(batch)):
+                # Truncated output shows up as invalid JSON or a short list
+                parsed = _parse_json_text(text)
+                if not isinstance(parsed, list) or len(parsed) != expected:
+                    raise ValueError("Batch answer count does not match question count")
+                return [str(answer).strip() for answer in parsed]
+
+            try:
+                batch_answers = self._cached_generate(batch_prompt, cache_key=cache_key, validate=parse)
+            except ValueError:
+                # Malformed or truncated answer list: retry with a smaller batch
+                batch_size = max(1, int(batch_size * 0.9))
+                continue
+            except InvalidArgument as e:
+                # Request too large for the model; anything else (bad key,
+                # quota, network) is not helped by shrinking
+                if not _is_too_large(e):
+                    raise Exception(f"CSV query error: {str(e)}")
+                batch_size = max(1, int(batch_size * 0.9))
+                continue
+            except Exception as e:
+                raise Exception(f"CSV query error: {str(e)}")
+
+            answers.extend(batch_answers)
+            i += len(batch)
+
+        return answers
+
+    def generate_detailed_insights(self, csv_summaries, language="English"):
+        """Generate high-level strategic insights for the dataset."""
+        prompt = [
+            self.INSIGHTS_SYSTEM_PREFIX,
+            INSIGHTS_PROMPT_TMPL.format_map({"summary": csv_summaries, "language": language}),
+        ]
         try:
-            response = self.model.generate_content(prompt)
-            return _safe_extract_text(response).strip()
+            return self._cached_generate(prompt).strip()
         except Exception as e:
             raise Exception(f"Insights generation error: {str(e)}")
@@ -1,17 +1,237 @@
 import pandas as pd
 import os
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow.csv as pv
+import xlsxwriter
+from joblib import Parallel, delayed
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.styles import getSampleStyleSheet
-import openpyxl
-import matplotlib.pyplot as plt
+import matplotlib
+# Non-interactive backend: no GUI initialisation in Flask worker processes
+matplotlib.use('Agg')
+# Coarser path simplification: charts are small thumbnails
+matplotlib.rcParams['path.simplify_threshold'] = 1.0
+from matplotlib.figure import Figure
 import seaborn as sns
 import numpy as np
 import io
 import base64
 
+# Row caps for chart rendering: browser previews are read from a bounded
+# prefix of the file, PDF charts from an even sample of the whole file,
+# and scatter plots are drawn from a further random sample
+PLOT_SAMPLE_ROWS = 50_000
+SCATTER_SAMPLE_ROWS = 5_000
+PLOT_PROBE_ROWS = 1_000
+
+# Per-target chart styles: small WebP thumbnails for the browser and
+# JPEG for PDF embedding (reportlab cannot read WebP)
+_CHART_STYLES = {
+    'web': {'figsize': (5, 3), 'dpi': 72, 'fmt': 'webp', 'colors': {}, 'full_file': False},
+    'pdf': {'figsize': (6, 3), 'dpi': None, 'fmt': 'jpeg',
+            'colors': {'numeric_hist': 'black', 'category_bar': 'grey'}, 'full_file': True},
+}
+
+# Rows written per to_excel call when streaming XLSX reports
+XLSX_CHUNK_ROWS = 100_000
+
+# Below this many columns the thread fan-out costs more than it saves
+PARALLEL_STATS_MIN_COLUMNS = 16
+
+# Encoded browser charts, cached per file path together with the mtime
+# they were rendered from (least recently used files are evicted)
+_plot_cache = OrderedDict()
+PLOT_CACHE_SIZE = 16
+_plot_cache_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=8)
+def _read_csv_cached(filepath, mtime_ns):
+    """Parse a CSV with Arrow's multi-threaded reader and convert to pandas.
+
+    Keyed on the file's mtime so a re-upload is picked up automatically,
+    while the stats/visualize/report calls for one file share a single parse.
+    """
+    table = pv.read_csv(filepath, read_options=pv.ReadOptions(use_threads=True))
+    return table.to_pandas(self_destruct=True, split_blocks=True)
+
+
+def _sample_step(rows):
+    """Row stride that spreads at most PLOT_SAMPLE_ROWS picks evenly over ``rows``."""
+    return max(1, -(-rows // PLOT_SAMPLE_ROWS))
+
+
+@functools.lru_cache(maxsize=4)
+def _read_plot_frame(filepath, mtime_ns, full_file=False):
+    """Read only the columns and rows the charts need.
+
+    By default a small probe read infers dtypes, then the first
+    categorical and first two numeric columns are read for at most
+    PLOT_SAMPLE_ROWS rows (fast browser previews). With ``full_file`` the
+    same columns are taken from the cached full parse and every n-th row
+    is kept, so the charts cover the whole file like the report's stats.
+    """
+    if full_file:
+        df = _read_csv_cached(filepath, mtime_ns)
+        chosen = list(df.select_dtypes(include=['object']).columns[:1])
+        chosen += list(df.select_dtypes(include=['number']).columns[:2])
+        return df[chosen].iloc[::_sample_step(len(df))]
+
+    probe = pd.read_csv(filepath, nrows=PLOT_PROBE_ROWS)
+    chosen = set(probe.select_dtypes(include=['object']).columns[:1])
+    chosen.update(probe.select_dtypes(include=['number']).columns[:2])
+    if not chosen:
+        return probe.iloc[:0, :0]
+    return pd.read_csv(filepath, usecols=lambda c: c in chosen, nrows=PLOT_SAMPLE_ROWS)
+
+
+def _chart_columns(df):
+    """Map each chart type to the column(s) it plots for this frame."""
+    charts = {}
+    cat_cols = df.select_dtypes(include=['object']).columns
+    num_cols = df.select_dtypes(include=['number']).columns
+    if not cat_cols.empty:
+        charts['category_bar'] = cat_cols[0]
+    if not num_cols.empty:
+        charts['numeric_hist'] = num_cols[0]
+    if len(num_cols) >= 2:
+        charts['numeric_scatter'] = (num_cols[0], num_cols[1])
+    return charts
+
+
+@functools.lru_cache(maxsize=64)
+def _render_chart(filepath, mtime_ns, chart_type, col, style):
+    """Render one chart to image bytes.
+
+    Cached on (file, mtime, chart, column, style) so repeated visualize and
+    report requests for an unchanged file reuse the rendered bytes. Uses a
+    standalone Figure (no pyplot state) so charts can render in threads.
+    """
+    opts = _CHART_STYLES[style]
+    df = _read_plot_frame(filepath, mtime_ns, opts['full_file'])
+    color = opts['colors'].get(chart_type)
+
+    fig = Figure(figsize=opts['figsize'])
+    ax = fig.subplots()
+    if chart_type == 'category_bar':
+        df[col].value_counts(sort=False).nlargest(10).plot(kind='bar', color=color, ax=ax)
+        ax.set_title(f'Top values in {col}')
+    elif chart_type == 'numeric_hist':
+        sns.histplot(df[col].dropna(), kde=True, color=color, ax=ax)
+        ax.set_title(f'Distribution of {col}')
+    elif chart_type == 'numeric_scatter':
+        x, y = col
+        # Bound the number of points seaborn has to rasterize
+        points = df.sample(min(len(df), SCATTER_SAMPLE_ROWS), random_state=0)
+        sns.scatterplot(data=points, x=x, y=y, ax=ax)
+        ax.set_title(f'{x} vs {y}')
+    else:
+        raise ValueError(f"Unknown chart type {chart_type}")
+
+    buf = io.BytesIO()
+    pil_kwargs = {'quality': 80, 'optimize': True} if opts['fmt'] == 'jpeg' else {'quality': 80}
+    fig.savefig(buf, format=opts['fmt'], bbox_inches='tight', dpi=opts['dpi'], pil_kwargs=pil_kwargs)
+    return buf.getvalue()
+
+
+def _numeric_summary(series):
+    """Five-number summary, mean and IQR outlier count for a numeric column.
+
+    Works on the raw float64 array so all quantiles come from a single
+    np.percentile call instead of one pandas pass per statistic.
+    """
+    arr = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    # Boolean indexing always copies, so ``arr`` is owned by this function
+    arr = arr[~np.isnan(arr)]
+    if arr.size == 0:
+        return {"mean": None, "min": None, "q1": None, "median": None,
+                "q3": None, "max": None, "outliers": 0}
+
+    mean = float(arr.mean())
+    # Partition the owned copy in place instead of letting numpy make
+    # another one; order doesn't matter for the outlier count below
+    mn, q1, med, q3, mx = np.percentile(arr, [0, 25, 50, 75, 100], overwrite_input=True)
+    iqr = q3 - q1
+    lower_bound = q1 - 1.5 * iqr
+    upper_bound = q3 + 1.5 * iqr
+
+    # Two masks sized for this column, allocated per call so no thread
+    # keeps scratch memory alive after the request; the comparisons and
+    # the OR write into them instead of creating temporaries
+    below = np.empty(arr.size, dtype=bool)
+    above = np.empty(arr.size, dtype=bool)
+    np.less(arr, lower_bound, out=below)
+    np.greater(arr, upper_bound, out=above)
+    np.logical_or(below, above, out=below)
+    outliers = int(np.count_nonzero(below))
+
+    return {
+        "mean": mean,
+        "min": float(mn),
+        "q1": float(q1),
+        "median": float(med),
+        "q3": float(q3),
+        "max": float(mx),
+        "outliers": outliers
+    }
+
+
+def _describe_numeric(df):
+    """Numeric summaries for every numeric column from one ``describe`` call.
+
+    Returns the same min/q1/median/q3/max/outliers keys as
+    ``_numeric_summary``; outlier counts are computed for all columns at
+    once by broadcasting the IQR bounds across the numeric frame.
+    """
+    num_cols = df.select_dtypes(include=['number'])
+    if num_cols.empty:
+        return {}
+
+    desc = num_cols.describe(percentiles=[.25, .5, .75])
+    iqr = desc.loc['75%'] - desc.loc['25%']
+    lower = desc.loc['25%'] - 1.5 * iqr
+    upper = desc.loc['75%'] + 1.5 * iqr
+    out_counts = ((num_cols < lower) | (num_cols > upper)).sum()
+
+    summaries = {}
+    for col in num_cols.columns:
+        row = desc[col]
+        empty = row['count'] == 0
+        summaries[col] = {
+            "mean": None if empty else float(row['mean']),
+            "min": None if empty else float(row['min']),
+            "q1": None if empty else float(row['25%']),
+            "median": None if empty else float(row['50%']),
+            "q3": None if empty else float(row['75%']),
+            "max": None if empty else float(row['max']),
+            "outliers": int(out_counts[col]),
+        }
+    return summaries
+
+
+def _stats_for_column(series):
+    """Build the stats dict for one column (safe to call from worker threads)."""
+    col_stats = {
+        "dtype": str(series.dtype),
+        "null_count": int(series.isnull().sum()),
+        "unique_count": int(series.nunique()),
+    }
+    if pd.api.types.is_numeric_dtype(series):
+        # 5-number summary + IQR for outliers
+        col_stats.update(_numeric_summary(series))
+    elif pd.api.types.is_string_dtype(series):
+        # Basic distribution for categorical
+        value_counts = series.value_counts(normalize=True, sort=False).nlargest(5).to_dict()
+        col_stats["top_values"] = value_counts
+    return col_stats
+
+
 class AnalyticsManager:
     def __init__(self, upload_folder):
         self.upload_folder = upload_folder
@@ -19,108 +239,134 @@ class AnalyticsManager:
     def _get_file_path(self, filename):
         return os.path.join(self.upload_folder, filename)
 
-    def get_column_stats(self, filename):
+    def _load_df(self, filename):
+        """Return the (cached) DataFrame for an uploaded CSV.
+
+        The returned frame is shared between callers and must not be mutated.
+        """
         filepath = self._get_file_path(filename)
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"File {filename} not found")
-        
-        df = pd.read_csv(filepath)
-        stats = {}
-        
-        for col in df.columns:
-            col_stats = {
-                "dtype": str(df[col].dtype),
-                "null_count": int(df[col].isnull().sum()),
-                "unique_count": int(df[col].nunique()),
-            }
-            if pd.api.types.is_numeric_dtype(df[col]):
-                # 5-number summary + IQR for outliers
-                q1 = float(df[col].quantile(0.25))
-                q3 = float(df[col].quantile(0.75))
-                iqr = q3 - q1
-                lower_bound = q1 - 1.5 * iqr
-                upper_bound = q3 + 1.5 * iqr
-                outliers = int(((df[col] < lower_bound) | (df[col] > upper_bound)).sum())
-
-                col_stats.update({
-                    "mean": float(df[col].mean()) if not df[col].isnull().all() else None,
-                    "min": float(df[col].min()),
-                    "q1": q1,
-                    "median": float(df[col].median()),
-                    "q3": q3,
-                    "max": float(df[col].max()),
-                    "outliers": outliers
-                })
-            elif pd.api.types.is_string_dtype(df[col]):
-                 # Basic distribution for categorical
-                 value_counts = df[col].value_counts(normalize=True).head(5).to_dict()
-                 col_stats["top_values"] = value_counts
-
-            stats[col] = col_stats
-        
-        return stats
+        return _read_csv_cached(filepath, os.stat(filepath).st_mtime_ns)
 
-    def generate_visualizations_base64(self, filename):
-        """Generate common plots for the dataset and return as base64 strings."""
+    def _render_charts(self, filename, style, chart_types=None):
+        """Render the charts for ``filename`` concurrently and return {chart: bytes}."""
         filepath = self._get_file_path(filename)
-        df = pd.read_csv(filepath)
-        plots = {}
-
-        # 1. Bar chart for first categorical column
-        cat_cols = df.select_dtypes(include=['object']).columns
-        if not cat_cols.empty:
-            col = cat_cols[0]
-            plt.figure(figsize=(6, 4))
-            df[col].value_counts().head(10).plot(kind='bar')
-            plt.title(f'Top values in {col}')
-            plots['category_bar'] = self._plot_to_base64()
-
-        # 2. Histogram for first numeric column
-        num_cols = df.select_dtypes(include=['number']).columns
-        if not num_cols.empty:
-            col = num_cols[0]
-            plt.figure(figsize=(6, 4))
-            sns.histplot(df[col].dropna(), kde=True)
-            plt.title(f'Distribution of {col}')
-            plots['numeric_hist'] = self._plot_to_base64()
-
-        # 3. Scatter if at least 2 numeric
-        if len(num_cols) >= 2:
-            plt.figure(figsize=(6, 4))
-            sns.scatterplot(data=df, x=num_cols[0], y=num_cols[1])
-            plt.title(f'{num_cols[0]} vs {num_cols[1]}')
-            plots['numeric_scatter'] = self._plot_to_base64()
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"File {filename} not found")
+        mtime_ns = os.stat(filepath).st_mtime_ns
 
-        return plots
+        charts = _chart_columns(_read_plot_frame(filepath, mtime_ns, _CHART_STYLES[style]['full_file']))
+        if chart_types is not None:
+            charts = {c: charts[c] for c in chart_types if c in charts}
+        if not charts:
+            return {}
 
-    def _plot_to_base64(self):
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight')
-        plt.close()
-        buf.seek(0)
-        return base64.b64encode(buf.getvalue()).decode('utf-8')
+        with ThreadPoolExecutor(max_workers=len(charts)) as ex:
+            futures = {
+                chart: ex.submit(_render_chart, filepath, mtime_ns, chart, col, style)
+                for chart, col in charts.items()
+            }
+            return {chart: fut.result() for chart, fut in futures.items()}
 
-        return report_filename
+    def get_column_stats(self, filename):
+        df = self._load_df(filename)
+        columns = list(df.columns)
+
+        # Columns are independent and the heavy lifting is numpy/pandas C
+        # code that releases the GIL, so wide frames are fanned out to threads.
+        if len(columns) >= PARALLEL_STATS_MIN_COLUMNS:
+            results = Parallel(n_jobs=-1, prefer='threads')(
+                delayed(_stats_for_column)(df[col]) for col in columns
+            )
+        else:
+            results = [_stats_for_column(df[col]) for col in columns]
 
-    def generate_report(self, filename, report_type='pdf', language='English', insights=""):
+        return dict(zip(columns, results))
+
+    def generate_visualizations_base64(self, filename):
+        """Generate common plots for the dataset and return as base64 strings.
+
+        Charts render in threads (each on its own Figure) from the frame
+        already cached in this process; the encoded result is cached until
+        the file's mtime changes.
+        """
         filepath = self._get_file_path(filename)
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"File {filename} not found")
-        
-        df = pd.read_csv(filepath)
+        mtime_ns = os.stat(filepath).st_mtime_ns
+
+        with _plot_cache_lock:
+            cached = _plot_cache.get(filepath)
+            if cached is not None:
+                _plot_cache.move_to_end(filepath)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+
+        charts = self._render_charts(filename, 'web')
+        plots = {chart: base64.b64encode(data).decode('ascii') for chart, data in charts.items()}
+
+        with _plot_cache_lock:
+            # One entry per file (a new mtime replaces the old one), LRU-bounded
+            _plot_cache[filepath] = (mtime_ns, plots)
+            _plot_cache.move_to_end(filepath)
+            while len(_plot_cache) > PLOT_CACHE_SIZE:
+                _plot_cache.popitem(last=False)
+        return plots
+
+    def generate_report(self, filename, report_type='pdf', language='English', insights="", stats=None):
+        """Write a PDF or XLSX report next to the upload and return its filename.
+
+        ``stats`` may be the dict already returned by ``get_column_stats`` so
+        the PDF table does not recompute the column statistics. Without it,
+        only the numeric summaries the PDF needs are computed, in one
+        ``describe`` pass over the frame.
+        """
+        df = self._load_df(filename)
         report_filename = f"report_{os.path.basename(filename).split('.')[0]}.{report_type}"
         report_path = os.path.join(self.upload_folder, report_filename)
 
         if report_type == 'pdf':
-            self._create_pdf_report(df, report_path, filename, language, insights)
+            if stats is None:
+                stats = _describe_numeric(df)
+            self._create_pdf_report(df, stats, report_path, filename, language, insights)
         elif report_type == 'xlsx':
-            df.to_excel(report_path, index=False)
+            self._write_xlsx(df, report_path)
         else:
             raise ValueError("Unsupported report type")
             
         return report_filename
 
-    def _create_pdf_report(self, df, output_path, original_filename, language='English', insights=""):
+    def _write_xlsx(self, df, output_path):
+        """Stream ``df`` to an XLSX file with bounded memory.
+
+        xlsxwriter's constant_memory mode flushes each row to disk once the
+        next one starts, so rows must be written strictly in order; pandas'
+        to_excel writes column by column and loses everything past the
+        first column in that mode. The rows are therefore written here with
+        write_row, converting one chunk of the frame at a time.
+        """
+        workbook = xlsxwriter.Workbook(output_path, {
+            'constant_memory': True,
+            'strings_to_urls': False,
+            'remove_timezone': True,
+            'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+        })
+        try:
+            worksheet = workbook.add_worksheet('data')
+            worksheet.write_row(0, 0, [str(col) for col in df.columns])
+            row_num = 1
+            for start in range(0, len(df), XLSX_CHUNK_ROWS):
+                chunk = df.iloc[start:start + XLSX_CHUNK_ROWS]
+                # Missing values become empty cells instead of NaN/NaT
+                chunk = chunk.astype(object).where(chunk.notna(), None)
+                for row in chunk.itertuples(index=False, name=None):
+                    worksheet.write_row(row_num, 0, row)
+                    row_num += 1
+        finally:
+            workbook.close()
+
+    def _create_pdf_report(self, df, stats, output_path, original_filename, language='English', insights=""):
         doc = SimpleDocTemplate(output_path, pagesize=letter)
         styles = getSampleStyleSheet()
         elements = []
@@ -148,23 +394,18 @@ class AnalyticsManager:
 
         # Detailed Stats Table
         elements.append(Paragraph("Statistical Analysis (Numerical)", styles['Heading3']))
-        num_cols = df.select_dtypes(include=['number'])
-        if not num_cols.empty:
+        # Numeric columns are the ones get_column_stats gave a summary for
+        numeric_stats = [(col, col_stats) for col, col_stats in stats.items() if "median" in col_stats]
+        if numeric_stats:
             data = [['Column', 'Min', 'Q1', 'Median', 'Q3', 'Max', 'Outliers']]
-            for col in num_cols.columns:
-                q1 = float(df[col].quantile(0.25))
-                q3 = float(df[col].quantile(0.75))
-                iqr = q3 - q1
-                data.append([
-                    col,
-                    f"{df[col].min():.2f}",
-                    f"{q1:.2f}",
-                    f"{df[col].median():.2f}",
-                    f"{q3:.2f}",
-                    f"{df[col].max():.2f}",
-                    str(int(((df[col] < (q1 - 1.5*iqr)) | (df[col] > (q3 + 1.5*iqr))).sum()))
-                ])
-            
+            data += [
+                [col] + [
+                    f"{col_stats[key]:.2f}" if col_stats[key] is not None else "-"
+                    for key in ("min", "q1", "median", "q3", "max")
+                ] + [str(col_stats["outliers"])]
+                for col, col_stats in numeric_stats
+            ]
+
             table = Table(data, hAlign='LEFT')
             table.setStyle(TableStyle([
                 ('BACKGROUND', (0, 0), (-1, 0), colors.black),
@@ -181,37 +422,21 @@ class AnalyticsManager:
         elements.append(Paragraph("Data Visualizations", styles['Heading2']))
         elements.append(Spacer(1, 6))
         
-        # 1. Distribution Chart
-        if not num_cols.empty:
-            col = num_cols.columns[0]
-            plt.figure(figsize=(6, 3))
-            sns.histplot(df[col].dropna(), kde=True, color='black')
-            plt.title(f'Distribution of {col}')
-            
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', bbox_inches='tight')
-            plt.close()
-            img_buffer.seek(0)
-            
-            img = Image(img_buffer, width=400, height=200)
-            elements.append(img)
-            elements.append(Spacer(1, 12))
-
-        # 2. Categorical Analysis
-        cat_cols = df.select_dtypes(include=['object'])
-        if not cat_cols.empty:
-            col = cat_cols.columns[0]
-            plt.figure(figsize=(6, 3))
-            df[col].value_counts().head(10).plot(kind='bar', color='grey')
-            plt.title(f'Top values in {col}')
-            
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', bbox_inches='tight')
-            plt.close()
-            img_buffer.seek(0)
-            
-            img = Image(img_buffer, width=400, height=200)
-            elements.append(img)
-            elements.append(Spacer(1, 12))
+        # Charts are rendered concurrently (and cached) before layout
+        charts = self._render_charts(original_filename, 'pdf', ('numeric_hist', 'category_bar'))
+        step = _sample_step(len(df))
+        if charts and step > 1:
+            # Say so when the charts are drawn from a sample, unlike the table above
+            sampled = -(-len(df) // step)
+            elements.append(Paragraph(
+                f"Charts are drawn from an even sample of {sampled} of {len(df)} rows (1 row in every {step}).",
+                styles['Italic']
+            ))
+            elements.append(Spacer(1, 6))
+        for chart in ('numeric_hist', 'category_bar'):
+            if chart in charts:
+                img = Image(io.BytesIO(charts[chart]), width=400, height=200)
+                elements.append(img)
+                elements.append(Spacer(1, 12))
 
         doc.build(elements)
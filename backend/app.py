@@ -10,37 +10,91 @@ Each route returns JSON and uses the manager classes defined in the
 backend to separate concerns (DB, AI, file handling).
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from config import Config
-from database import DatabaseManager
+from database import get_shared_db
 from ai_manager import AIManager
 from file_manager import FileManager
-from auth import check_password, generate_token, token_required, role_required
+from auth import check_password, hash_password, needs_rehash, generate_token, token_required, role_required, ensure_default_users, reject_unknown_user
 from models import users_db, Role
 from schema_manager import SchemaManager
 from analytics_manager import AnalyticsManager
-import os
-from werkzeug.utils import secure_filename
+import dataclasses
+import decimal
+import itertools
+import re
+import orjson
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+from werkzeug.exceptions import BadRequest, HTTPException
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _orjson_default(obj):
+    # MySQL DECIMAL columns; everything else orjson can't encode goes
+    # through Flask's default handling (dataclasses, __html__, ...)
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    return DefaultJSONProvider.default(obj)
+
+
+def _dumps(value):
+    return orjson.dumps(value, default=_orjson_default, option=_ORJSON_OPTIONS)
+
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson.
+
+    orjson serializes datetimes (ISO 8601), numpy values and UUIDs natively
+    and is several times faster than the stdlib encoder. Keys keep their
+    insertion order instead of being sorted.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return _dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Build the body as bytes directly, skipping the str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(_dumps(obj), mimetype='application/json')
+
 
 # Create Flask app and load configuration
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 config = Config()
 # Set Flask config from Config object
 app.config['UPLOAD_FOLDER'] = config.UPLOAD_FOLDER
 app.config['MAX_FILE_SIZE'] = config.MAX_FILE_SIZE
 app.config['SECRET_KEY'] = config.SECRET_KEY
+# Let a fronting Apache/lighttpd (mod_xsendfile) send downloads itself
+app.config['USE_X_SENDFILE'] = config.USE_X_SENDFILE
 # Configure CORS to only allow configured origins
 CORS(app, origins=config.CORS_ORIGINS)
 
 # Initialize manager instances used across routes
-db_manager = DatabaseManager()
+db_manager = get_shared_db()
 ai_manager = AIManager()
 file_manager = FileManager()
-schema_manager = SchemaManager()
+schema_manager = SchemaManager(db_manager)
 analytics_manager = AnalyticsManager(config.UPLOAD_FOLDER)
 
 
+# -------------------- Error Handling -------------------- #
+@app.errorhandler(Exception)
+def handle_error(e):
+    """Turn any exception raised by a route into the JSON error body the UI expects."""
+    if isinstance(e, HTTPException):
+        # 4xx raised on purpose (BadRequest, NotFound, ...) keep their code
+        return jsonify({"error": e.description}), e.code
+    app.logger.exception(e)
+    return jsonify({"error": str(e)}), 500
+
+
 # -------------------- Authentication -------------------- #
 @app.route('/api/login', methods=['POST'])
 def login():
@@ -50,22 +104,62 @@ def login():
     
     user = users_db.get(data.get('username'))
     if not user:
-        # For security, don't reveal if user exists
+        # First login after startup: seed the default accounts lazily
+        ensure_default_users()
+        user = users_db.get(data.get('username'))
+    if not user:
+        # For security, don't reveal if user exists (by message or by timing)
+        reject_unknown_user(data.get('password'))
         return jsonify({'message': 'Invalid credentials'}), 401
     
     if check_password(data.get('password'), user.password_hash):
+        if needs_rehash(user.password_hash):
+            # Transparently upgrade legacy bcrypt / outdated argon2 hashes
+            users_db.add(dataclasses.replace(user, password_hash=hash_password(data.get('password'))))
         token = generate_token(user.username, user.role.value)
         return jsonify({
             'token': token, 
             'username': user.username, 
             'role': user.role.value,
-            'permissions': user.permissions
+            'permissions': sorted(user.permissions)
         })
     
     return jsonify({'message': 'Invalid credentials'}), 401
 
 
 # -------------------- MySQL Query Handler -------------------- #
+# Destructive intent in a natural language question. Word boundaries keep
+# names like "deleted_at" or "dropoff" from blocking ordinary questions.
+_DESTRUCTIVE_RE = re.compile(r'\b(?:delete|drop(?:\s+table)?|remove\s+table|truncate|alter)\b', re.IGNORECASE)
+# Generated statements that change the schema (and so invalidate its cache)
+_DDL_RE = re.compile(r'\s*(?:create|alter|drop|rename|truncate)\b', re.IGNORECASE)
+
+
+def _stream_query_response(sql_query, explanation, chunks, max_rows):
+    """Yield the /api/query JSON body, writing result rows chunk by chunk.
+
+    ``chunks`` may hold one row more than ``max_rows``; that row is dropped
+    and reported as ``"truncated": true``.
+    """
+    explanation_json = _dumps(explanation)
+    yield (b'{"sql":' + _dumps(sql_query) + b',"message":null,"explanation":' + explanation_json
+           + b',"reply":' + explanation_json + b',"results":[')
+    first = True
+    sent = 0
+    truncated = False
+    for rows in chunks:
+        if sent + len(rows) > max_rows:
+            rows = rows[:max_rows - sent]
+            truncated = True
+        if not rows:
+            continue
+        sent += len(rows)
+        body = b",".join(_dumps(row) for row in rows)
+        yield body if first else b"," + body
+        first = False
+    yield b'],"truncated":' + (b'true' if truncated else b'false') + b'}'
+
+
 @app.route('/api/query', methods=['POST'])
 @token_required
 def query_database(current_user):
@@ -78,45 +172,47 @@ def query_database(current_user):
     language = data.get('language', 'English')
     
     if not user_query:
-        return jsonify({"error": "No query provided"}), 400
-
-    try:
-        # Check if user is trying to delete/drop (even before generating SQL)
-        query_lower = user_query.lower()
-        if any(keyword in query_lower for keyword in ['delete', 'drop table', 'drop', 'remove table']):
-            # Check if user has delete permission
-            if 'delete' not in current_user.permissions and '*' not in current_user.permissions:
-                return jsonify({
-                    "error": "PERMISSION_DENIED",
-                    "message": f"You don't have permission to delete/drop resources. Only administrators can perform this action. Current role: {current_user.role.value}"
-                }), 403
-        
-        # 1. Get Schema (Dynamic)
-        schema_string = db_manager.get_schema()
-
-        # 2. Determine if user has destructive permissions
-        allow_destructive = 'delete' in current_user.permissions or '*' in current_user.permissions
-
-        # 3. Generate SQL
-        sql_query = ai_manager.generate_sql_query(user_query, schema_string, allow_destructive=allow_destructive)
-
-        # 4. Execute SQL
-        # If it's a SELECT, we get results list. If it's DML/DDL, we get a status message or rows affected.
-        results = db_manager.execute_query(sql_query)
-
-        # 5. Generate Explanation (in requested language)
-        explanation = ai_manager.generate_query_explanation(sql_query, results, language=language)
-
-        return jsonify({
-            "sql": sql_query,
-            "results": results if isinstance(results, list) else [],
-            "message": str(results) if not isinstance(results, list) else None,
-            "explanation": explanation,
-            "reply": explanation 
-        })
+        raise BadRequest("No query provided")
+
+    # Check if user is trying to delete/drop (even before generating SQL)
+    if _DESTRUCTIVE_RE.search(user_query):
+        # Check if user has delete permission
+        if not current_user.has_permission('delete'):
+            return jsonify({
+                "error": "PERMISSION_DENIED",
+                "message": f"You don't have permission to delete/drop resources. Only administrators can perform this action. Current role: {current_user.role.value}"
+            }), 403
+    
+    # 1. Get Schema (Dynamic)
+    schema_string, schema_hash = db_manager.get_schema_and_hash()
+
+    # 2. Determine if user has destructive permissions
+    allow_destructive = current_user.has_permission('delete')
+
+    # 3. Generate SQL and its explanation (in requested language) in one call
+    sql_query, explanation = ai_manager.generate_sql_and_explanation(
+        user_query, schema_string, language=language, allow_destructive=allow_destructive,
+        schema_hash=schema_hash
+    )
+
+    # 4. Execute SQL. Every statement goes through the streaming path, so
+    # any result set (SELECT, WITH, SHOW, ...) is capped at MAX_ROWS and
+    # DML/DDL simply yields no rows. The first chunk is pulled now so SQL
+    # errors still produce a normal JSON error response, and a statement
+    # without rows has finished running by the time it returns.
+    # One row past the cap tells the writer the result was truncated
+    chunks = db_manager.stream_query(sql_query, limit=config.MAX_ROWS + 1)
+    first_chunk = next(chunks, [])
+    if _DDL_RE.match(sql_query):
+        # Admin DDL through the chat changed the schema
+        db_manager.invalidate_schema()
+    return Response(
+        stream_with_context(_stream_query_response(
+            sql_query, explanation, itertools.chain([first_chunk], chunks), config.MAX_ROWS
+        )),
+        mimetype='application/json'
+    )
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
 
 @app.route('/api/upload_csv', methods=['POST'])
 @token_required
@@ -126,27 +222,15 @@ def upload_csv(current_user):
     Files are saved to 'uploads' folder.
     """
     if 'files' not in request.files:
-        return jsonify({"error": "No files part"}), 400
+        raise BadRequest("No files part")
     
     files = request.files.getlist('files')
-    saved_files = []
-
     try:
-        upload_folder = config.UPLOAD_FOLDER
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-
-        for file in files:
-            if file and file.filename.endswith('.csv'):
-                # Basic filename sanitization
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(upload_folder, filename)
-                file.save(filepath)
-                saved_files.append(filename)
-        
-        return jsonify({"message": f"Successfully uploaded {len(saved_files)} files", "files": saved_files})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        saved_files = file_manager.save_uploaded_files(files)
+    except ValueError as e:
+        raise BadRequest(str(e))
+    
+    return jsonify({"message": f"Successfully uploaded {len(saved_files)} files", "files": saved_files})
 
 @app.route('/api/analyze_csvs', methods=['POST'])
 @token_required
@@ -156,15 +240,12 @@ def analyze_csvs(current_user):
     Expects JSON: { "language": "English" } (Optional)
     """
     language = request.json.get('language', 'English') if request.json else 'English'
-    try:
-        csv_summaries = file_manager.get_csv_summaries()
-        if not csv_summaries:
-             return jsonify({"analysis": "No CSV files found or files are empty."})
+    csv_summaries = file_manager.get_csv_data_summaries()
+    if not csv_summaries:
+         return jsonify({"analysis": "No CSV files found or files are empty."})
 
-        analysis = ai_manager.analyze_csv_files(csv_summaries, language=language)
-        return jsonify({"analysis": analysis})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    analysis = ai_manager.analyze_csv_files(csv_summaries, language=language)
+    return jsonify({"analysis": analysis})
 
 @app.route('/api/query_csv', methods=['POST'])
 @token_required
@@ -172,62 +253,66 @@ def query_csv(current_user):
     """
     Query uploaded CSV data.
     Expects JSON: { "query": "question", "language": "English" }
+    or { "queries": ["question", ...], "language": "English" } to answer
+    several questions with batched model calls.
     """
     data = request.json
     user_query = data.get('query')
+    user_queries = data.get('queries')
     language = data.get('language', 'English')
 
-    if not user_query:
-        return jsonify({"error": "No query provided"}), 400
+    if not user_query and not user_queries:
+        raise BadRequest("No query provided")
 
-    try:
-        csv_data = file_manager.get_csv_content_preview()
-        if not csv_data:
-            return jsonify({"response": "No CSV data available to query."})
+    csv_data = file_manager.get_csv_data_for_query()
+    if not csv_data:
+        return jsonify({"response": "No CSV data available to query."})
+
+    if user_queries:
+        responses = ai_manager.query_csv_data_batch(user_queries, csv_data, language=language)
+        return jsonify({"responses": responses})
 
-        response = ai_manager.query_csv_data(user_query, csv_data, language=language)
-        return jsonify({"response": response})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    response = ai_manager.query_csv_data(user_query, csv_data, language=language)
+    return jsonify({"response": response})
 
 
 
 # -------------------- Schema Management -------------------- #
+@app.route('/api/schema', methods=['GET'])
+@token_required
+def get_schema_text(current_user):
+    """
+    Return the current database schema description as plain text.
+    Served from the cached UTF-8 bytes, so nothing is re-rendered per request.
+    """
+    return Response(db_manager.get_schema_bytes(), mimetype='text/plain')
+
 @app.route('/api/schema/tables', methods=['GET'])
 @token_required
 def list_tables(current_user):
-    try:
-        tables = schema_manager.list_tables()
-        return jsonify({"tables": tables})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    tables = schema_manager.list_tables()
+    return jsonify({"tables": tables})
 
 @app.route('/api/schema/tables', methods=['POST'])
 @token_required
 @role_required([Role.ADMIN])
 def create_table(current_user):
-    try:
-        data = request.get_json()
-        table_name = data.get('table_name')
-        columns = data.get('columns')
-        
-        if not table_name or not columns:
-             return jsonify({"error": "table_name and columns are required"}), 400
-             
-        result = schema_manager.create_table(table_name, columns)
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data = request.get_json()
+    table_name = data.get('table_name')
+    columns = data.get('columns')
+    
+    if not table_name or not columns:
+        raise BadRequest("table_name and columns are required")
+         
+    result = schema_manager.create_table(table_name, columns)
+    return jsonify(result)
 
 @app.route('/api/schema/tables/<table_name>', methods=['DELETE'])
 @token_required
 @role_required([Role.ADMIN])
 def delete_table(current_user, table_name):
-    try:
-        result = schema_manager.delete_table(table_name)
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    result = schema_manager.delete_table(table_name)
+    return jsonify(result)
 
 
 # -------------------- Analytics & Reporting -------------------- #
@@ -235,11 +320,8 @@ def delete_table(current_user, table_name):
 @token_required
 def list_analytics_files(current_user):
     """List all CSV files available for analytics."""
-    try:
-        files = file_manager.get_csv_files()
-        return jsonify({"files": files})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    files = file_manager.get_csv_files()
+    return jsonify({"files": files})
 
 @app.route('/api/analytics/stats', methods=['POST'])
 @token_required
@@ -250,25 +332,19 @@ def get_file_stats(current_user):
     """
     filename = request.json.get('filename')
     if not filename:
-        return jsonify({"error": "Filename is required"}), 400
+        raise BadRequest("Filename is required")
     
-    try:
-        stats = analytics_manager.get_column_stats(filename)
-        return jsonify({"stats": stats})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    stats = analytics_manager.get_column_stats(filename)
+    return jsonify({"stats": stats})
 
 @app.route('/api/analytics/visualize', methods=['POST'])
 @token_required
 def get_visualizations(current_user):
     filename = request.json.get('filename')
     if not filename:
-        return jsonify({"error": "Filename is required"}), 400
-    try:
-        plots = analytics_manager.generate_visualizations_base64(filename)
-        return jsonify({"plots": plots})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        raise BadRequest("Filename is required")
+    plots = analytics_manager.generate_visualizations_base64(filename)
+    return jsonify({"plots": plots})
 
 @app.route('/api/analytics/insights', methods=['POST'])
 @token_required
@@ -276,13 +352,10 @@ def get_detailed_insights(current_user):
     filename = request.json.get('filename')
     language = request.json.get('language', 'English')
     if not filename:
-        return jsonify({"error": "Filename is required"}), 400
-    try:
-        stats = analytics_manager.get_column_stats(filename)
-        insights = ai_manager.generate_detailed_insights(stats, language=language)
-        return jsonify({"insights": insights})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        raise BadRequest("Filename is required")
+    stats = analytics_manager.get_column_stats(filename)
+    insights = ai_manager.generate_detailed_insights(stats, language=language)
+    return jsonify({"insights": insights})
 
 @app.route('/api/analytics/report', methods=['POST'])
 @token_required
@@ -297,30 +370,32 @@ def generate_report(current_user):
     language = data.get('language', 'English')
     
     if not filename:
-        return jsonify({"error": "Filename is required"}), 400
+        raise BadRequest("Filename is required")
 
-    try:
-        # Fetch insights first for the PDF report
-        stats = analytics_manager.get_column_stats(filename)
-        insights = ai_manager.generate_detailed_insights(stats, language=language)
-        
-        report_filename = analytics_manager.generate_report(filename, report_type, language, insights)
-        # Return download URL
-        return jsonify({
-            "message": "Report generated",
-            "download_url": f"/api/download/{report_filename}"
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    # Fetch insights first for the PDF report
+    stats = analytics_manager.get_column_stats(filename)
+    insights = ai_manager.generate_detailed_insights(stats, language=language)
+    
+    report_filename = analytics_manager.generate_report(filename, report_type, language, insights, stats=stats)
+    # Return download URL
+    return jsonify({
+        "message": "Report generated",
+        "download_url": f"/api/download/{report_filename}"
+    })
 
 @app.route('/api/download/<filename>', methods=['GET'])
 @token_required
 def download_file(current_user, filename):
-    """Download a file from the uploads directory."""
-    try:
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=True)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 404
+    """Download a file from the uploads directory.
+
+    Responses carry an mtime-based ETag and Last-Modified and honour
+    conditional/range requests, so a re-download of an unchanged report
+    is a 304. With USE_X_SENDFILE the proxy streams the bytes instead.
+    """
+    return send_from_directory(
+        app.config['UPLOAD_FOLDER'], filename, as_attachment=True,
+        conditional=True, max_age=config.DOWNLOAD_MAX_AGE
+    )
 
 # -------------------- Health Check -------------------- #
 @app.route('/api/health', methods=['GET'])
@@ -341,5 +416,11 @@ def serve_index():
 
 
 if __name__ == "__main__":
-    # Start the Flask development server using configured debug/port
-    app.run(debug=config.DEBUG, port=8000)
+    if config.DEBUG:
+        # Start the Flask development server using configured debug/port
+        app.run(debug=config.DEBUG, port=8000)
+    else:
+        # Production: serve with waitress so many requests can wait on
+        # Gemini / MySQL at once instead of queueing behind one another
+        from waitress import serve
+        serve(app, host=config.SERVER_HOST, port=8000, threads=config.SERVER_THREADS)
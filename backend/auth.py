@@ -1,6 +1,15 @@
 import jwt
-import datetime
+import orjson
 import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+import hmac
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from cachetools import TLRUCache
 from functools import wraps
 from flask import request, jsonify
 from config import Config
@@ -8,20 +17,124 @@ from models import users_db, User, Role
 
 config = Config()
 SECRET_KEY = "your-very-secret-key-change-this-in-env" # In production, load from env
+# Encoded once so PyJWT does not re-encode the key on every call
+_SECRET_KEY_BYTES = SECRET_KEY.encode('utf-8')
+# Reusable JWS signer; generate_token serializes the claims itself
+_SIGNER = jwt.PyJWS()
+_ALGORITHM = 'HS256'
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+TOKEN_LIFETIME = 24 * 3600 # seconds
+# A freshly issued token is handed out again for this long (seconds)
+TOKEN_REUSE_SECONDS = 3600
+# Successful password verifications are remembered for this long (seconds)
+VERIFY_CACHE_TTL = 60
+VERIFY_CACHE_SIZE = 1024
 
-def check_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+# Per-process random pepper: cache keys are HMACs of the password, so the
+# raw password is never stored and keys are useless outside this process
+_PEPPER = os.urandom(32)
+_verify_cache = OrderedDict()
+_verify_lock = threading.Lock()
+_token_cache = {}
+_token_lock = threading.Lock()
+
+# Verified tokens -> (username, role, exp). Each entry expires together with
+# its token, so a cache hit skips the HMAC check and JSON parse. The user
+# itself is looked up on every request, so role changes and removals apply
+# to tokens that were already issued.
+VERIFIED_TOKEN_CACHE_SIZE = 10000
+_verified_tokens = TLRUCache(
+    maxsize=VERIFIED_TOKEN_CACHE_SIZE,
+    ttu=lambda token, claims, now: claims[2],
+    timer=time.time
+)
+_verified_lock = threading.Lock()
+
+# New hashes are argon2id; bcrypt hashes are still accepted and upgraded on login
+_hasher = PasswordHasher(
+    time_cost=config.ARGON2_TIME_COST,
+    memory_cost=config.ARGON2_MEMORY_COST,
+    parallelism=config.ARGON2_PARALLELISM
+)
+
+def hash_password(password: str) -> bytes:
+    return _hasher.hash(password).encode('ascii')
+
+def _verify_hash(password_bytes: bytes, hashed: bytes) -> bool:
+    if hashed.startswith(b"$argon2"):
+        try:
+            return _hasher.verify(hashed, password_bytes)
+        except (VerificationError, InvalidHashError):
+            return False
+    # Legacy bcrypt hash; a malformed stored hash is a failed login, not a 500
+    try:
+        return bcrypt.checkpw(password_bytes, hashed)
+    except ValueError:
+        return False
+
+def needs_rehash(hashed: bytes) -> bool:
+    """True for legacy bcrypt hashes or argon2 hashes with outdated parameters."""
+    return not hashed.startswith(b"$argon2") or _hasher.check_needs_rehash(hashed)
+
+_dummy_hash = None
+
+def reject_unknown_user(password: str) -> bool:
+    """Spend one full hash verification for a username that doesn't exist.
+
+    Without this an unknown user is rejected instantly while a known one
+    pays the KDF, which lets callers enumerate usernames by timing. The
+    dummy hash is created on first use. Always returns False.
+    """
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(os.urandom(16).hex())
+    _verify_hash(password.encode('utf-8'), _dummy_hash)
+    return False
+
+def check_password(password: str, hashed: bytes) -> bool:
+    """Verify ``password`` against an argon2id (or legacy bcrypt) hash.
+
+    Successful verifications are cached for VERIFY_CACHE_TTL seconds, keyed
+    on the stored hash and a peppered HMAC of the password, so repeated
+    logins (SPA reloads, token refresh) skip the deliberately slow KDF.
+    Failures are never cached, so guessing still pays the full KDF cost.
+    """
+    password_bytes = password.encode('utf-8')
+    key = (hashed, hmac.new(_PEPPER, password_bytes, hashlib.sha256).hexdigest())
+    now = time.monotonic()
+
+    with _verify_lock:
+        verified_at = _verify_cache.get(key)
+        if verified_at is not None and now - verified_at < VERIFY_CACHE_TTL:
+            return True
+
+    if not _verify_hash(password_bytes, hashed):
+        return False
+
+    with _verify_lock:
+        _verify_cache[key] = now
+        _verify_cache.move_to_end(key)
+        while len(_verify_cache) > VERIFY_CACHE_SIZE:
+            _verify_cache.popitem(last=False)
+    return True
 
 def generate_token(username: str, role: str) -> str:
-    payload = {
+    """Issue a JWT, reusing a recent token for the same (username, role)."""
+    now = time.time()
+    with _token_lock:
+        cached = _token_cache.get((username, role))
+        if cached is not None and now - cached[1] < TOKEN_REUSE_SECONDS:
+            return cached[0]
+
+    payload = orjson.dumps({
         'sub': username,
         'role': role,
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-    }
-    return jwt.encode(payload, SECRET_KEY, algorithm='HS256')
+        'exp': int(now) + TOKEN_LIFETIME
+    })
+    token = _SIGNER.encode(payload, _SECRET_KEY_BYTES, algorithm=_ALGORITHM)
+    with _token_lock:
+        _token_cache[(username, role)] = (token, now)
+    return token
 
 def token_required(f):
     @wraps(f)
@@ -35,30 +148,50 @@ def token_required(f):
         if not token:
             return jsonify({'message': 'Token is missing'}), 401
         
-        try:
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            current_user = users_db.get(data['sub'])
-            if not current_user:
-                 return jsonify({'message': 'User not found'}), 401
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
+        with _verified_lock:
+            claims = _verified_tokens.get(token)
+
+        if claims is None:
+            try:
+                data = jwt.decode(token, _SECRET_KEY_BYTES, algorithms=[_ALGORITHM])
+                claims = (data['sub'], data['role'], data['exp'])
+            except jwt.ExpiredSignatureError:
+                return jsonify({'message': 'Token has expired'}), 401
+            except (jwt.InvalidTokenError, KeyError):
+                return jsonify({'message': 'Invalid token'}), 401
+            with _verified_lock:
+                _verified_tokens[token] = claims
+
+        current_user = users_db.get(claims[0])
+        if not current_user:
+            # Token may predate a restart; seed defaults and retry once
+            ensure_default_users()
+            current_user = users_db.get(claims[0])
+        if not current_user:
+            return jsonify({'message': 'User not found'}), 401
+        if current_user.role.value != claims[1]:
+            # Role changed since the token was issued; make the user log in again
+            with _verified_lock:
+                _verified_tokens.pop(token, None)
             return jsonify({'message': 'Invalid token'}), 401
-        
+
         return f(current_user, *args, **kwargs)
     
     return decorated
 
 def role_required(allowed_roles):
+    # Built once per decorated route rather than on every request
+    allowed = frozenset(allowed_roles)
     def decorator(f):
+        operation_name = f.__name__.lower()
+        is_destructive = 'delete' in operation_name or 'drop' in operation_name
         @wraps(f)
         def decorated_function(current_user, *args, **kwargs):
-            if current_user.role not in allowed_roles:
+            if current_user.role not in allowed:
                 # Provide specific message based on operation
-                operation_name = f.__name__
                 role_str = current_user.role.value
                 
-                if 'delete' in operation_name.lower() or 'drop' in operation_name.lower():
+                if is_destructive:
                     message = f"You don't have permission to delete/drop resources. Only administrators can perform this action. Current role: {role_str}"
                 else:
                     message = f"You don't have the required permissions to perform this action. Required role(s): {', '.join([r.value for r in allowed_roles])}. Current role: {role_str}"
@@ -68,18 +201,39 @@ def role_required(allowed_roles):
         return decorated_function
     return decorator
 
-# Initialize a default admin user if not exists
-if "admin" not in users_db:
-    users_db["admin"] = User(
-        username="admin", 
-        password_hash=hash_password("admin123"), 
-        role=Role.ADMIN,
-        permissions=User.get_default_permissions(Role.ADMIN)
-    )
-    # Also add a viewer for testing
-    users_db["viewer"] = User(
-        username="viewer", 
-        password_hash=hash_password("viewer123"), 
-        role=Role.VIEWER,
-        permissions=User.get_default_permissions(Role.VIEWER)
-    )
+# Default users are seeded on first use rather than at import, so starting
+# (or forking) the app doesn't pay for two password hashes up front.
+_defaults_seeded = False
+_defaults_lock = threading.Lock()
+
+def ensure_default_users():
+    """Create the default admin/viewer accounts if they don't exist yet.
+
+    Pre-hashed credentials can be supplied via ADMIN_PASSWORD_HASH and
+    VIEWER_PASSWORD_HASH (argon2 or bcrypt); otherwise the development
+    passwords are hashed here, once.
+    """
+    global _defaults_seeded
+    if _defaults_seeded:
+        return
+    with _defaults_lock:
+        if _defaults_seeded:
+            return
+        if "admin" not in users_db:
+            admin_hash = config.ADMIN_PASSWORD_HASH
+            users_db.add(User(
+                username="admin", 
+                password_hash=admin_hash.encode('utf-8') if admin_hash else hash_password("admin123"), 
+                role=Role.ADMIN,
+                permissions=User.get_default_permissions(Role.ADMIN)
+            ))
+        if "viewer" not in users_db:
+            # Also add a viewer for testing
+            viewer_hash = config.VIEWER_PASSWORD_HASH
+            users_db.add(User(
+                username="viewer", 
+                password_hash=viewer_hash.encode('utf-8') if viewer_hash else hash_password("viewer123"), 
+                role=Role.VIEWER,
+                permissions=User.get_default_permissions(Role.VIEWER)
+            ))
+        _defaults_seeded = True
@@ -18,20 +18,60 @@ class Config:
     # Gemini API Configuration - set your real key in the environment
     # No hard-coded default here for security; set GEMINI_API_KEY in your .env
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+    GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-pro')
+    # Optional SDK transport override ('rest' for networks that block gRPC).
+    # Unset keeps the SDK default, a persistent gRPC channel.
+    GEMINI_TRANSPORT = os.getenv('GEMINI_TRANSPORT') or None
+    GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT')
+    # Number of model responses kept in the in-memory prompt cache (0 disables)
+    AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE', 256))
+    # Input token budget used when packing several questions into one prompt
+    AI_CONTEXT_TOKENS = int(os.getenv('AI_CONTEXT_TOKENS', 30720))
+    # Lifetime (seconds) of explicit Gemini context caches for the schema
+    # prompt prefix; 0 disables them. Needs a model version that supports
+    # caching and a schema above the API's minimum cacheable token count.
+    AI_EXPLICIT_CACHE_TTL = int(os.getenv('AI_EXPLICIT_CACHE_TTL', 0))
 
     # Database Configuration - defaults suitable for local dev
     DB_HOST = os.getenv('DB_HOST', 'localhost')
     DB_USER = os.getenv('DB_USER', 'root')
     DB_PASSWORD = os.getenv('DB_PASSWORD', 'root')
     DB_NAME = os.getenv('DB_NAME', 'library_db')
+    # Connection pool size and how long a request waits for a free connection
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+    # Seconds an introspected schema is reused before re-reading it
+    SCHEMA_TTL = int(os.getenv('SCHEMA_TTL', 600))
+    # Maximum rows returned for a chat query (the rest is dropped server-side)
+    MAX_ROWS = int(os.getenv('MAX_ROWS', 10000))
 
     # File Upload Configuration
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', './uploads')
     MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 16 * 1024 * 1024))  # 16MB
+    # Introspected schema persisted across restarts
+    SCHEMA_CACHE_FILE = os.getenv('SCHEMA_CACHE_FILE', os.path.join(UPLOAD_FOLDER, '.schema_cache.json'))
+    # Browser cache lifetime (seconds) for downloaded reports
+    DOWNLOAD_MAX_AGE = int(os.getenv('DOWNLOAD_MAX_AGE', 3600))
+    # Hand file downloads to the web server via X-Sendfile (needs a proxy
+    # with mod_xsendfile or equivalent in front of the app)
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'False').lower() == 'true'
+
+    # Password hashing cost (argon2id)
+    ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 2))
+    ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 65536))  # KiB
+    ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 1))
+
+    # Optional pre-hashed passwords for the seeded admin/viewer accounts
+    ADMIN_PASSWORD_HASH = os.getenv('ADMIN_PASSWORD_HASH')
+    VIEWER_PASSWORD_HASH = os.getenv('VIEWER_PASSWORD_HASH')
 
     # Flask Configuration
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
     DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
+    # Production server (waitress, used when DEBUG is false). Requests spend
+    # most of their time waiting on Gemini, so use plenty of threads.
+    SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+    SERVER_THREADS = int(os.getenv('SERVER_THREADS', 32))
 
     # CORS Configuration - comma-separated list supported
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
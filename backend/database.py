@@ -6,121 +6,473 @@ It also provides a lightweight textual schema that is used to help the AI
 model produce valid SQL for this specific database.
 """
 
+import hashlib
+import json
+import os
+import threading
+import time
 import mysql.connector #imports the mysql.connector module into memory.
+from mysql.connector import pooling
+from mysql.connector.constants import ClientFlag
 from config import Config #Imports the Config class from the config.py file
 
+# Process-wide cache of the rendered schema string and its fingerprint,
+# as a (schema, hash, built_at, schema_bytes) tuple. It is shared by every
+# DatabaseManager (the API's and SchemaManager's) so DDL issued through
+# one instance invalidates the prompt schema used by the other. Entries
+# older than SCHEMA_TTL seconds are rebuilt to pick up outside changes.
+_schema_cache = None
+_schema_lock = threading.RLock()
+
+# One connection pool per process, shared by every DatabaseManager so
+# SchemaManager (or any other caller) doesn't open a second set of sockets
+_pool = None
+_pool_lock = threading.Lock()
+# Single-connection pool with multi-statement support (the connector's
+# default flags), used only for the app's own introspection batch. The
+# main pool explicitly clears MULTI_STATEMENTS so model-generated SQL
+# can't smuggle a second statement ("SELECT ...; DROP ...") past the checks.
+_meta_pool = None
+
+# Client errors meaning the socket died: server gone away (2006), lost
+# during query (2013), lost with a system error (2055)
+_LOST_CONNECTION_ERRNOS = frozenset((2006, 2013, 2055))
+
 #Defines a new class object named DatabaseManager
 class DatabaseManager:
-    """Manage a single MySQL connection used by the API.
+    """Manage a pool of MySQL connections used by the API.
 
-    Note: For production use you would typically use a connection pool. This
-    simple manager is suitable for development and small deployments.
+    Each query borrows a connection from the pool and returns it when done,
+    so concurrent Flask requests no longer serialize on a single socket.
     """
     #Input: self → an instance of DatabaseManager.
     #Output: Initializes the instance; returns None.
     def __init__(self):
-        # Load DB configuration and establish connection immediately
+        # Load DB configuration and attach the (shared) pool immediately
         self.config = Config() #Calls the Config class (no external argument).It Creates an instance of Config and assigns it to self.config.
-        self.connection = None #Sets the attribute connection to None.
-        self.connect() #Establishes a MySQL connection; returns None
+        self.pool = None #Sets the attribute pool to None.
+        self.connect() #Attaches (creating on first use) the MySQL connection pool; returns None
 
-    #Establishes connection and assigns to self.connection. Returns None.
+    #Attaches the process-wide connection pool to self.pool. Returns None.
     def connect(self):
-        """Establish database connection using config values."""
+        """Attach the shared connection pool, creating it on first use."""
+        global _pool
+        with _pool_lock:
+            if _pool is None:
+                _pool = self._create_pool()
+        self.pool = _pool
+
+    def _create_pool(self):
+        """Create the database connection pool using config values."""
         try:
-            #Returns a mysql.connector.connection.MySQLConnection object and assigns it to self.connection
-            self.connection = mysql.connector.connect(
+            #Returns a MySQLConnectionPool holding DB_POOL_SIZE open connections
+            pool = pooling.MySQLConnectionPool(
+                pool_name="t2db",
+                pool_size=self.config.DB_POOL_SIZE,
+                pool_reset_session=True,
                 host=self.config.DB_HOST, #string
                 user=self.config.DB_USER, #string
                 password=self.config.DB_PASSWORD, #string
-                database=self.config.DB_NAME #string
+                database=self.config.DB_NAME, #string
+                # Statements from the chat/admin panel are committed as they run
+                autocommit=True,
+                # Prefer the C extension for faster row parsing
+                use_pure=False,
+                # MULTI_STATEMENTS is on by default; turn it off here
+                client_flags=[-ClientFlag.MULTI_STATEMENTS]
             )
             # Informational print for local dev logs
-            print("Database connected successfully")
+            print("Database connection pool created")
+            return pool
         except mysql.connector.Error as e:
             # Print and re-raise so the app can fail-fast if DB is unreachable
             print(f"Database connection error: {e}")
             raise
+
+    def _get_meta_connection(self):
+        """Borrow the multi-statement metadata connection (created on first use).
+
+        Only get_schema_and_hash() uses it, under _schema_lock, so a single
+        connection is never contended.
+        """
+        global _meta_pool
+        with _pool_lock:
+            if _meta_pool is None:
+                _meta_pool = pooling.MySQLConnectionPool(
+                    pool_name="t2db_meta",
+                    pool_size=1,
+                    host=self.config.DB_HOST,
+                    user=self.config.DB_USER,
+                    password=self.config.DB_PASSWORD,
+                    database=self.config.DB_NAME,
+                    autocommit=True,
+                    use_pure=False
+                )
+        return _meta_pool.get_connection()
+
+    def _get_connection(self):
+        """Borrow a pooled connection, waiting up to DB_POOL_TIMEOUT seconds.
+
+        MySQLConnectionPool raises immediately when every connection is in
+        use, so retry briefly instead of failing the request.
+        """
+        deadline = time.monotonic() + self.config.DB_POOL_TIMEOUT
+        while True:
+            try:
+                return self.pool.get_connection()
+            except pooling.PoolError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.05)
+
+    @staticmethod
+    def _should_retry(error, query):
+        """True if a failed statement can safely be re-run on a new connection.
+
+        The pool only checks a connection when it is handed out, so a socket
+        the server dropped (wait_timeout, restart) can still fail the next
+        statement. A 2013 may mean a write already ran, so only reads are
+        retried for it; 2006/2055 fail before the statement is sent.
+        """
+        if getattr(error, 'errno', None) not in _LOST_CONNECTION_ERRNOS:
+            return False
+        if error.errno == 2013:
+            return query.lstrip()[:6].upper() in ("SELECT", "SHOW", "DESCRI", "EXPLAI")
+        return True
+
     ##Output: Returns query results as a list of dict
     def execute_query(self, query):
         """Execute SQL query and return results as a list of dicts.
 
         The cursor is created with dictionary=True so rows are returned as
         Python dicts which are JSON-serializable by Flask's jsonify.
+        Statements without a result set (DML/DDL) return an empty list.
         """
         try:
-            cursor = self.connection.cursor(dictionary=True) 
-            #Input: Boolean flag dictionary=True.
-            #Output: Returns a MySQLCursorDict object (cursor that outputs dicts).
-            cursor.execute(query) 
-            #Input:query (string SQL statement).
-            #Output: Executes SQL command → returns None.
-            results = cursor.fetchall() #Output: Returns all fetched rows as a list of dictionaries (List[Dict[str, Any]]).
-            cursor.close()
-            return results
+            try:
+                return self._run_query(query)
+            except mysql.connector.Error as e:
+                if not self._should_retry(e, query):
+                    raise
+                # The pool reconnects a dead connection when it is next borrowed
+                print(f"Lost database connection ({e.errno}), retrying once")
+                return self._run_query(query)
         #Catches and binds the exception to variable e. Type: mysql.connector.errors.Error
         except mysql.connector.Error as e:
             # Print error for debugging and re-raise for higher-level handling
             print(f"Query execution error: {e}")
             raise
 
+    def _run_query(self, query):
+        """Run one statement on a borrowed connection (see execute_query)."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            #Output: Returns a MySQLCursorDict object (cursor that outputs dicts).
+            try:
+                cursor.execute(query)
+                #Input:query (string SQL statement).
+                if not cursor.with_rows:
+                    return []
+                return cursor.fetchall() #Output: List[Dict[str, Any]]
+            finally:
+                cursor.close()
+        finally:
+            # Returns the connection to the pool
+            conn.close()
+
+    def execute_prepared(self, query, params=(), dictionary=True):
+        """Execute a parameterized statement through a server-side prepared cursor.
+
+        For the app's own fixed queries (never model-generated SQL): values
+        are sent separately from the statement text, so they cannot alter
+        it. Returns rows as dicts (or tuples with ``dictionary=False``).
+        """
+        try:
+            try:
+                return self._run_prepared(query, params, dictionary)
+            except mysql.connector.Error as e:
+                if not self._should_retry(e, query):
+                    raise
+                print(f"Lost database connection ({e.errno}), retrying once")
+                return self._run_prepared(query, params, dictionary)
+        except mysql.connector.Error as e:
+            print(f"Query execution error: {e}")
+            raise
+
+    def _run_prepared(self, query, params, dictionary):
+        """Run one prepared statement on a borrowed connection."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor(prepared=True, dictionary=dictionary)
+            try:
+                cursor.execute(query, params)
+                return cursor.fetchall() if cursor.with_rows else []
+            finally:
+                cursor.close()
+        finally:
+            # Returns the connection to the pool
+            conn.close()
+
+    def execute_many(self, query, seq_of_params):
+        """Run one parameterized statement for every params tuple in a single batch.
+
+        For bulk DML from the app itself (seeding, imports). mysql-connector
+        rewrites an ``INSERT ... VALUES (%s, ...)`` into one multi-row
+        INSERT, so N rows cost one round trip instead of N. Returns the
+        number of affected rows.
+        """
+        seq_of_params = list(seq_of_params)
+        if not seq_of_params:
+            return 0
+        try:
+            try:
+                return self._run_many(query, seq_of_params)
+            except mysql.connector.Error as e:
+                if not self._should_retry(e, query):
+                    raise
+                print(f"Lost database connection ({e.errno}), retrying once")
+                return self._run_many(query, seq_of_params)
+        except mysql.connector.Error as e:
+            print(f"Query execution error: {e}")
+            raise
+
+    def _run_many(self, query, seq_of_params):
+        """Run executemany on a borrowed connection."""
+        conn = self._get_connection()
+        try:
+            # A plain (non-prepared) cursor, so the multi-row INSERT rewrite applies
+            cursor = conn.cursor()
+            try:
+                cursor.executemany(query, seq_of_params)
+                return cursor.rowcount
+            finally:
+                cursor.close()
+        finally:
+            # Returns the connection to the pool
+            conn.close()
+
+    def _execute_unbuffered(self, query):
+        """Execute ``query`` on an unbuffered dict cursor of a borrowed connection.
+
+        Returns ``(conn, cursor)`` for the caller to read and release; on
+        failure the connection is returned to the pool here.
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            try:
+                cursor.execute(query)
+            except Exception:
+                cursor.close()
+                raise
+            return conn, cursor
+        except Exception:
+            conn.close()
+            raise
+
+    def stream_query(self, query, chunk=1000, limit=None):
+        """Yield the rows of a statement as lists of up to ``chunk`` dicts.
+
+        Uses an unbuffered cursor so MySQL streams rows as they are fetched
+        instead of materializing the whole result set first. At most
+        ``limit`` rows are yielded when given. Statements without a result
+        set (DML/DDL) run and yield nothing. The pooled connection is held
+        until the generator is exhausted or closed.
+        """
+        try:
+            try:
+                conn, cursor = self._execute_unbuffered(query)
+            except mysql.connector.Error as e:
+                if not self._should_retry(e, query):
+                    raise
+                # Nothing has been yielded yet, so the statement can be re-run
+                print(f"Lost database connection ({e.errno}), retrying once")
+                conn, cursor = self._execute_unbuffered(query)
+        except mysql.connector.Error as e:
+            print(f"Query execution error: {e}")
+            raise
+
+        try:
+            try:
+                # Whether rows come back is decided by the server, not by
+                # the statement's first keyword (WITH, SHOW, "(SELECT ...")
+                if not cursor.with_rows:
+                    return
+                remaining = limit
+                while remaining is None or remaining > 0:
+                    rows = cursor.fetchmany(chunk if remaining is None else min(chunk, remaining))
+                    if not rows:
+                        break
+                    if remaining is not None:
+                        remaining -= len(rows)
+                    yield rows
+            finally:
+                # Drain unread rows (limit reached, client disconnected) so
+                # the connection goes back to the pool in a clean state
+                conn.consume_results()
+                cursor.close()
+        except mysql.connector.Error as e:
+            print(f"Query execution error: {e}")
+            raise
+        finally:
+            # Returns the connection to the pool
+            conn.close()
+
     def close(self):
-        """Close the underlying DB connection if it's open."""
-        if self.connection:
-            self.connection.close()
+        """Close the idle connections of the shared pool."""
+        if self.pool:
+            self.pool._remove_connections()
+
+    def invalidate_schema(self):
+        """Drop the cached schema so the next get_schema() re-introspects."""
+        global _schema_cache
+        with _schema_lock:
+            _schema_cache = None
+            try:
+                os.remove(self.config.SCHEMA_CACHE_FILE)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error removing schema cache file: {e}")
+
+    def _load_schema_file(self):
+        """Return the schema persisted by a previous run if still fresh, else None."""
+        try:
+            with open(self.config.SCHEMA_CACHE_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get("db") != self.config.DB_NAME:
+            return None
+        schema_str, built_at = data.get("schema"), data.get("built_at")
+        # A file missing either value (or holding the wrong types) is a miss
+        if not isinstance(schema_str, str) or not isinstance(built_at, (int, float)):
+            return None
+        if time.time() - built_at >= self.config.SCHEMA_TTL:
+            return None
+        return schema_str, built_at
+
+    def _save_schema_file(self, schema_str, built_at):
+        """Persist the schema so a restart doesn't have to re-introspect."""
+        tmp_path = self.config.SCHEMA_CACHE_FILE + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.config.SCHEMA_CACHE_FILE) or ".", exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"db": self.config.DB_NAME, "schema": schema_str, "built_at": built_at}, f)
+            os.replace(tmp_path, self.config.SCHEMA_CACHE_FILE)
+        except OSError as e:
+            print(f"Error writing schema cache file: {e}")
 
     #Returns a textual (string) schema description.
     def get_schema(self):
-        """Return a textual representation of the database schema dynamically.
-        
-        Introspects the information_schema to build the schema string.
+        """Return a textual representation of the database schema.
+
+        The introspected string is cached process-wide (and on disk, so it
+        survives restarts) for SCHEMA_TTL seconds or until
+        invalidate_schema() is called (SchemaManager does so after DDL).
+        """
+        return self.get_schema_and_hash()[0]
+
+    def get_schema_and_hash(self):
+        """Return ``(schema, fingerprint)``.
+
+        The fingerprint is an 8-byte BLAKE2b digest of the schema string,
+        computed once per introspection. AI caches embed it in their keys,
+        so after DDL the new fingerprint simply stops matching old entries.
+        """
+        entry = self._get_schema_entry()
+        return entry[0], entry[1]
+
+    def get_schema_bytes(self):
+        """Return the schema as UTF-8 bytes, encoded once per introspection.
+
+        For callers that send it straight over the wire (the /api/schema
+        route) without re-encoding the string on every request.
         """
+        return self._get_schema_entry()[3]
+
+    def _get_schema_entry(self):
+        """Return the cached ``(schema, hash, built_at, schema_bytes)`` tuple, refreshing it if stale."""
+        global _schema_cache
+        with _schema_lock:
+            if _schema_cache is not None and time.time() - _schema_cache[2] < self.config.SCHEMA_TTL:
+                return _schema_cache
+
+            persisted = self._load_schema_file() if _schema_cache is None else None
+            if persisted is not None:
+                schema_str, built_at = persisted
+            else:
+                schema_str = self._introspect_schema()
+                if schema_str is None:
+                    # Don't cache failures; report them and retry next call
+                    schema_str = f"Database: {self.config.DB_NAME} (Error retrieving schema)"
+                    schema_bytes = schema_str.encode("utf-8")
+                    return (schema_str, hashlib.blake2b(schema_bytes, digest_size=8).digest(), time.time(), schema_bytes)
+                built_at = time.time()
+                self._save_schema_file(schema_str, built_at)
+
+            # Encode once; the fingerprint and get_schema_bytes() share it
+            schema_bytes = schema_str.encode("utf-8")
+            _schema_cache = (schema_str, hashlib.blake2b(schema_bytes, digest_size=8).digest(), built_at, schema_bytes)
+            return _schema_cache
+
+    def _introspect_schema(self):
+        """Build the schema string from information_schema (None on error)."""
         try:
-            schema_str = f"Database: {self.config.DB_NAME}\nTables:\n"
-            
-            # Get all tables
-            cursor = self.connection.cursor()
-            cursor.execute(f"SHOW TABLES")
-            tables = cursor.fetchall()
-            
-            relationships = []
-            
-            for i, table_row in enumerate(tables):
-                table_name = table_row[0]
-                
-                # Get columns for each table
-                cursor.execute(f"DESCRIBE {table_name}")
-                columns = cursor.fetchall()
-                col_defs = []
-                for col in columns:
-                    col_name = col[0]
-                    col_defs.append(col_name)
-                    
-                schema_str += f"{i+1}. {table_name}({', '.join(col_defs)})\n"
-                
-                # Try to infer simple foreign keys (naive approach or use constraints query)
-                # For simplified version, we just check foreign key constraints
-                cursor.execute(f"""
-                    SELECT 
-                        TABLE_NAME, COLUMN_NAME, CONSTRAINT_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
-                    FROM
-                        INFORMATION_SCHEMA.KEY_COLUMN_USAGE
-                    WHERE
-                        REFERENCED_TABLE_SCHEMA = '{self.config.DB_NAME}' AND
-                        TABLE_NAME = '{table_name}';
-                """)
-                fks = cursor.fetchall()
-                for fk in fks:
-                    relationships.append(f"- {fk[0]}.{fk[1]} -> {fk[3]}.{fk[4]}")
+            conn = self._get_meta_connection()
+        except Exception as e:
+            print(f"Error introspecting schema: {e}")
+            return None
 
+        try:
+            # Two set-oriented data-dictionary queries replace SHOW TABLES
+            # plus a DESCRIBE and an FK lookup per table (1 + 2N round
+            # trips); they are sent as one multi-statement batch (1 trip)
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT TABLE_NAME, COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS "
+                "WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, ORDINAL_POSITION; "
+                "SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME "
+                "FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE "
+                "WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_SCHEMA = %s "
+                "ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION",
+                (self.config.DB_NAME, self.config.DB_NAME, self.config.DB_NAME)
+            )
+            cols_by_table = {}
+            for table_name, col_name in cursor.fetchall():
+                cols_by_table.setdefault(table_name, []).append(col_name)
+
+            # Second result set of the batch
+            fks = cursor.fetchall() if cursor.nextset() else []
             cursor.close()
-            
-            if relationships:
-                schema_str += "Relationships:\n" + "\n".join(relationships) + "\n"
-                
-            return schema_str
+
+            # Collect the pieces and join once instead of growing a string
+            parts = [f"Database: {self.config.DB_NAME}\nTables:\n"]
+            for i, (table_name, col_defs) in enumerate(cols_by_table.items()):
+                parts.append(f"{i+1}. {table_name}({', '.join(col_defs)})\n")
+
+            if fks:
+                parts.append("Relationships:\n")
+                parts.extend(f"- {fk[0]}.{fk[1]} -> {fk[2]}.{fk[3]}\n" for fk in fks)
+
+            return "".join(parts)
             
         except Exception as e:
             print(f"Error introspecting schema: {e}")
-            # Fallback to empty or simple message
-            return f"Database: {self.config.DB_NAME} (Error retrieving schema)"
+            return None
+        finally:
+            # Returns the connection to the pool
+            conn.close()
+
+
+_shared_db = None
+_shared_db_lock = threading.Lock()
+
+def get_shared_db():
+    """Return the process-wide DatabaseManager, creating it on first use."""
+    global _shared_db
+    with _shared_db_lock:
+        if _shared_db is None:
+            _shared_db = DatabaseManager()
+    return _shared_db
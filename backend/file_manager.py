@@ -6,11 +6,140 @@ Each method has defensive error handling so the API can continue even if
 one uploaded file is malformed.
 """
 
+import functools
+import json
 import os
-import pandas as pd
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow.csv as pv
 from config import Config
 
 
+# Rows kept per file: enough for both the summary (3) and query (5) samples
+CSV_SAMPLE_ROWS = 5
+
+
+# Uploads are copied in 1 MiB chunks; the first 4 KiB are sniffed
+UPLOAD_CHUNK_SIZE = 1 << 20
+CSV_SNIFF_BYTES = 4096
+
+# Anything outside this set becomes "_"; path separators included
+_UNSAFE_FILENAME_RE = re.compile(rb'[^A-Za-z0-9._-]+')
+
+# Bytes allowed in text: printable ASCII, tab/CR/LF, and UTF-8 high bytes
+_TEXT_BYTES = bytes(range(0x20, 0x7f)) + b'\t\r\n' + bytes(range(0x80, 0x100))
+
+
+def _safe_filename(filename):
+    """Sanitize an uploaded filename (replacement for secure_filename).
+
+    Leading dots/underscores are stripped so names like "../x.csv" or
+    ".env" cannot escape the folder or create hidden files.
+    """
+    name = _UNSAFE_FILENAME_RE.sub(b'_', filename.encode('utf-8', 'ignore'))
+    return name.lstrip(b'._').decode('ascii')
+
+
+def _looks_like_csv(head):
+    """Cheap text check on the first bytes of an upload.
+
+    Rejects empty files, anything containing NUL bytes, and data that is
+    more than 5% non-text bytes (spreadsheets, zips, images renamed .csv).
+    """
+    if not head or b'\x00' in head:
+        return False
+    if b',' not in head and b'\n' not in head:
+        return False
+    # translate() with delete removes the text bytes, leaving the binary ones
+    binary = len(head.translate(None, _TEXT_BYTES))
+    return binary / len(head) <= 0.05
+
+
+def _upload_size(file):
+    """Size of an uploaded FileStorage, or None if it can't be told up front."""
+    if file.content_length:
+        return file.content_length
+    stream = file.stream
+    try:
+        pos = stream.tell()
+        size = stream.seek(0, os.SEEK_END)
+        stream.seek(pos)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+# Sidecar file holding a CSV's parsed sample, so restarts skip parsing
+SUMMARY_SUFFIX = ".summary.json"
+
+
+def _parse_csv_head(path, nrows):
+    """Parse just the first ``nrows`` rows with Arrow's streaming reader.
+
+    Stops after the first block(s), so only about 1 MiB is read and parsed
+    regardless of the file size.
+    """
+    reader = pv.open_csv(path, read_options=pv.ReadOptions(block_size=1 << 20))
+    try:
+        cols = reader.schema.names
+        rows = []
+        for batch in reader:
+            # Convert column-wise and zip into row dicts; cheaper than
+            # to_pylist(), which builds each row with a per-cell lookup
+            head = batch.slice(0, nrows - len(rows))
+            values = [column.to_pylist() for column in head.columns]
+            rows.extend(dict(zip(cols, row)) for row in zip(*values))
+            if len(rows) >= nrows:
+                break
+        return cols, rows
+    finally:
+        reader.close()
+
+
+def _write_summary(path, mtime_ns, size, nrows):
+    """Parse a CSV's sample, store it in the sidecar and return ``(columns, rows)``.
+
+    Values are stored with ``default=str`` (dates, decimals) and the
+    JSON round-tripped form is returned, so callers see the same data
+    whether it came from the CSV or from the sidecar.
+    """
+    columns, rows = _parse_csv_head(path, nrows)
+    payload = json.dumps(
+        {"mtime_ns": mtime_ns, "size": size, "nrows": nrows, "columns": columns, "sample": rows},
+        default=str
+    )
+    try:
+        with open(path + SUMMARY_SUFFIX, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    except OSError as e:
+        print(f"Error writing summary for {path}: {e}")
+    data = json.loads(payload)
+    return data["columns"], data["sample"]
+
+
+@functools.lru_cache(maxsize=64)
+def _load_csv_head(path, mtime_ns, size, nrows):
+    """Return ``(columns, rows)`` for the first ``nrows`` rows of a CSV.
+
+    Keyed on (path, mtime, size) so a re-uploaded file is read again. Only
+    the small sample is cached, not the parsed table, so the cache stays
+    cheap even for large files. Callers must not mutate the result.
+
+    On a miss the sidecar summary is used when it matches the file's
+    mtime and size; otherwise the CSV is parsed and the sidecar rewritten.
+    """
+    try:
+        with open(path + SUMMARY_SUFFIX, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if (data.get("mtime_ns"), data.get("size"), data.get("nrows")) == (mtime_ns, size, nrows):
+            return data["columns"], data["sample"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return _write_summary(path, mtime_ns, size, nrows)
+
+
 class FileManager:
     """Manage file uploads and provide lightweight CSV summaries.
 
@@ -30,33 +159,116 @@ class FileManager:
         """Create upload folder if it doesn't exist."""
         os.makedirs(self.upload_folder, exist_ok=True)
 
+    def _save_one(self, file):
+        """Validate and stream one upload to disk; return its filename or None."""
+        filename = _safe_filename(file.filename)
+        if not filename.endswith('.csv'):
+            return None
+
+        # Reject oversized files before anything is written
+        size = _upload_size(file)
+        if size is not None and size > self.config.MAX_FILE_SIZE:
+            print(f"Rejected {filename}: {size} bytes exceeds MAX_FILE_SIZE")
+            return None
+
+        # Sniff the first bytes so binaries never reach the upload folder
+        head = file.stream.read(CSV_SNIFF_BYTES)
+        if not _looks_like_csv(head):
+            print(f"Rejected {filename}: does not look like CSV text")
+            return None
+
+        path = os.path.join(self.upload_folder, filename)
+        # Copy into a temporary file in the same folder and only replace the
+        # target once the upload is accepted, so a rejected upload never
+        # clobbers an existing CSV of the same name
+        fd, tmp_path = tempfile.mkstemp(prefix='.upload-', suffix='.tmp', dir=self.upload_folder)
+        try:
+            with open(fd, 'wb', buffering=UPLOAD_CHUNK_SIZE) as dst:
+                dst.write(head)
+                shutil.copyfileobj(file.stream, dst, UPLOAD_CHUNK_SIZE)
+                written = dst.tell()
+            if written > self.config.MAX_FILE_SIZE:
+                # Size wasn't known up front
+                print(f"Rejected {filename}: {written} bytes exceeds MAX_FILE_SIZE")
+                return None
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        # Write the sidecar summary now, while the file is hot in cache
+        st = os.stat(path)
+        try:
+            _write_summary(path, st.st_mtime_ns, st.st_size, CSV_SAMPLE_ROWS)
+        except Exception as e:
+            print(f"Error summarizing {filename}: {e}")
+        return filename
+
     def save_uploaded_files(self, files):
         """Save uploaded files to the upload folder.
 
         - Accepts the Werkzeug FileStorage list from Flask request.files
-        - Only saves files that end with '.csv'
-        - Returns a list of saved file system paths
+        - Sanitizes names and only keeps '.csv' files that sniff as text
+          and fit within MAX_FILE_SIZE
+        - Streams each file to disk in 1 MiB chunks
+        - Returns a list of saved filenames
         """
-        uploaded_paths = []
+        saved_files = []
 
         for file in files:
-            # Basic filename-based validation; extend as needed
-            if file.filename.endswith('.csv'):
-                path = os.path.join(self.upload_folder, file.filename)
-                # Save file to disk
-                file.save(path)
-                uploaded_paths.append(path)
-
-        if not uploaded_paths:
+            if not file or not file.filename:
+                continue
+            filename = self._save_one(file)
+            if filename:
+                saved_files.append(filename)
+
+        # Overwritten files usually change mtime/size, but drop cached
+        # samples anyway in case a rewrite lands within the same tick
+        _load_csv_head.cache_clear()
+
+        if not saved_files:
             # If no CSVs saved, raise an error the API route can report
             raise ValueError("No valid CSV files uploaded.")
 
-        return uploaded_paths
+        return saved_files
+
+    def get_csv_entries(self):
+        """Return ``os.DirEntry`` objects for the CSVs in the upload folder.
+
+        scandir gets the file type from the directory read itself, and each
+        entry caches its ``stat()`` result, so callers can use ``e.path`` and
+        ``e.stat()`` without extra syscalls per file.
+        """
+        with os.scandir(self.upload_folder) as it:
+            return [e for e in it if e.name.endswith('.csv') and e.is_file()]
 
     def get_csv_files(self):
         """Return a list of CSV filenames in upload folder."""
-        files = os.listdir(self.upload_folder)
-        return [file for file in files if file.endswith('.csv')]
+        return [e.name for e in self.get_csv_entries()]
+
+    def _load_head(self, entry):
+        """Cached (columns, first CSV_SAMPLE_ROWS rows) for an uploaded CSV entry."""
+        st = entry.stat()
+        return _load_csv_head(entry.path, st.st_mtime_ns, st.st_size, CSV_SAMPLE_ROWS)
+
+    def _read_one(self, entry):
+        """Return ``(filename, (columns, rows))``, or None if the CSV can't be read."""
+        try:
+            return entry.name, self._load_head(entry)
+        except Exception as e:
+            # On error, print/log and skip the problematic file
+            print(f"Error reading {entry.name}: {e}")
+            return None
+
+    def _read_heads(self, entries):
+        """Read the sample of every file, overlapping the file I/O in threads."""
+        if len(entries) <= 1:
+            results = [self._read_one(entry) for entry in entries]
+        else:
+            with ThreadPoolExecutor(max_workers=min(8, len(entries))) as ex:
+                results = list(ex.map(self._read_one, entries))
+        return dict(result for result in results if result is not None)
 
     def get_csv_data_summaries(self):
         """Get light summaries for all CSV files.
@@ -64,22 +276,11 @@ class FileManager:
         Each entry contains column names and a small sample (first 3 rows)
         suitable for sending to the AI model (keeps payloads small).
         """
-        csv_data_summaries = {}
-        files = self.get_csv_files()
-
-        for file in files:
-            try:
-                df = pd.read_csv(os.path.join(self.upload_folder, file))
-                csv_data_summaries[file] = {
-                    "columns": list(df.columns),
-                    "sample": df.head(3).to_dict(orient="records")
-                }
-            except Exception as e:
-                # On error, print/log and skip the problematic file
-                print(f"Error reading {file}: {e}")
-                continue
-
-        return csv_data_summaries
+        heads = self._read_heads(self.get_csv_entries())
+        return {
+            file: {"columns": columns, "sample": rows[:3]}
+            for file, (columns, rows) in heads.items()
+        }
 
     def get_csv_data_for_query(self):
         """Return CSV data prepared for querying by the AI manager.
@@ -87,27 +288,23 @@ class FileManager:
         This includes column lists and a slightly larger sample (first 5 rows)
         to give the model enough context for answering user queries.
         """
-        csv_data = {}
-        files = self.get_csv_files()
+        heads = self._read_heads(self.get_csv_entries())
+        return {
+            file: {"columns": columns, "sample": rows}
+            for file, (columns, rows) in heads.items()
+        }
 
-        for file in files:
+    def clear_upload_folder(self):
+        """Remove all CSVs (and their summary sidecars) from the upload folder (used for cleanup/testing)."""
+        for entry in self.get_csv_entries():
             try:
-                df = pd.read_csv(os.path.join(self.upload_folder, file))
-                csv_data[file] = {
-                    "columns": list(df.columns),
-                    "sample": df.head(5).to_dict(orient="records")
-                }
+                os.remove(entry.path)
             except Exception as e:
-                print(f"Error reading {file}: {e}")
-                continue
-
-        return csv_data
-
-    def clear_upload_folder(self):
-        """Remove all CSVs from the upload folder (used for cleanup/testing)."""
-        files = self.get_csv_files()
-        for file in files:
+                print(f"Error removing {entry.name}: {e}")
             try:
-                os.remove(os.path.join(self.upload_folder, file))
+                os.remove(entry.path + SUMMARY_SUFFIX)
+            except FileNotFoundError:
+                pass
             except Exception as e:
-                print(f"Error removing {file}: {e}")
+                print(f"Error removing summary for {entry.name}: {e}")
+        _load_csv_head.cache_clear()
@@ -1,28 +1,83 @@
-from dataclasses import dataclass, field
-from typing import List, Optional
+from dataclasses import dataclass, replace
+from typing import FrozenSet, Optional
+from types import MappingProxyType
 import enum
+import sys
+import threading
 
+# Role stays a str-valued enum: its value is the wire format (JWT "role"
+# claim, login response, error messages). Members are singletons, so
+# membership checks against a frozenset of roles hash a cached str and
+# then match by identity; an IntEnum would not make them measurably faster.
 class Role(str, enum.Enum):
     ADMIN = "admin"
     EDITOR = "editor"
     VIEWER = "viewer"
 
-@dataclass
+# Default permission sets, built once
+_DEFAULT_PERMISSIONS = {
+    Role.ADMIN: frozenset({"*"}), # All permissions
+    Role.EDITOR: frozenset({"read", "insert", "update", "delete", "analyze"}),
+    Role.VIEWER: frozenset({"read", "analyze"}),
+}
+
+@dataclass(slots=True, frozen=True)
 class User:
     username: str
-    password_hash: str
+    password_hash: bytes
     role: Role = Role.VIEWER
-    permissions: List[str] = field(default_factory=list)
+    permissions: FrozenSet[str] = frozenset()
 
     @staticmethod
-    def get_default_permissions(role: Role) -> List[str]:
-        if role == Role.ADMIN:
-            return ["*"] # All permissions
-        elif role == Role.EDITOR:
-            return ["read", "insert", "update", "delete", "analyze"]
-        else: # Viewer
-            return ["read", "analyze"]
+    def get_default_permissions(role: Role) -> FrozenSet[str]:
+        return _DEFAULT_PERMISSIONS.get(role, _DEFAULT_PERMISSIONS[Role.VIEWER])
+
+    def has_permission(self, action: str) -> bool:
+        # Two hash probes on a frozenset; "*" grants everything
+        return "*" in self.permissions or action in self.permissions
+
+class UserStore:
+    """Read-mostly, copy-on-write user mapping.
+
+    Every request looks a user up, while writes (seeding, registration)
+    are rare. Writers build a new dict under a lock and swap it in with a
+    single attribute assignment, so readers never lock and always see a
+    complete snapshot. Stored usernames are interned once when added;
+    lookups use the caller's string as-is.
+    """
+
+    def __init__(self):
+        self._users = MappingProxyType({})
+        self._write_lock = threading.Lock()
+
+    def get(self, username, default=None):
+        if not isinstance(username, str):
+            return default
+        return self._users.get(username, default)
+
+    def __contains__(self, username):
+        return self.get(username) is not None
+
+    def __len__(self):
+        return len(self._users)
+
+    def add(self, user: "User"):
+        """Insert or replace ``user`` by publishing a new snapshot.
+
+        Users are immutable; to change one, add a ``dataclasses.replace``
+        copy under the same username.
+        """
+        user = replace(user, username=sys.intern(user.username))
+        with self._write_lock:
+            users = dict(self._users)
+            users[user.username] = user
+            self._users = MappingProxyType(users)
+
+    def snapshot(self):
+        """Return the current read-only mapping of username -> User."""
+        return self._users
+
 
 # Simple in-memory user store for demonstration (in a real app, this would be in the DB)
 # In this phase, we are initializing with a default admin
-users_db = {}
+users_db = UserStore()
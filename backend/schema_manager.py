@@ -1,8 +1,30 @@
-from database import DatabaseManager
+import re
+from database import get_shared_db
+
+# MySQL can't bind identifiers or types, so anything interpolated into DDL
+# must match these whitelists first
+_IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]{0,63}$')
+_COLUMN_TYPE_RE = re.compile(r'^[A-Za-z]+(\s*\(\s*\d+(\s*,\s*\d+)?\s*\))?(\s+UNSIGNED)?$', re.IGNORECASE)
+
+
+def _quote_identifier(name):
+    """Validate a table/column name and return it backtick-quoted."""
+    if not isinstance(name, str) or not _IDENTIFIER_RE.match(name):
+        raise ValueError(f"Invalid identifier: {name!r}")
+    return f"`{name}`"
+
+
+def _check_column_type(col_type):
+    if not isinstance(col_type, str) or not _COLUMN_TYPE_RE.match(col_type.strip()):
+        raise ValueError(f"Invalid column type: {col_type!r}")
+    return col_type.strip()
+
 
 class SchemaManager:
-    def __init__(self):
-        self.db = DatabaseManager()
+    def __init__(self, db=None):
+        # Reuse the caller's (or the process-wide) DatabaseManager rather
+        # than opening new connections per SchemaManager
+        self.db = db if db is not None else get_shared_db()
 
     def create_table(self, table_name, columns):
         """
@@ -12,7 +34,7 @@ class SchemaManager:
         try:
             col_defs = []
             for col in columns:
-                definition = f"{col['name']} {col['type']}"
+                definition = f"{_quote_identifier(col['name'])} {_check_column_type(col['type'])}"
                 if col.get('primary_key'):
                     definition += " PRIMARY KEY"
                 if col.get('not_null'):
@@ -22,12 +44,13 @@ class SchemaManager:
                 # Add check for auto_increment if INT and PK? simplify for now
                 col_defs.append(definition)
             
-            query = f"CREATE TABLE {table_name} ({', '.join(col_defs)});"
+            query = f"CREATE TABLE {_quote_identifier(table_name)} ({', '.join(col_defs)});"
             
             # Use execute_query but expect no results for DDL usually, 
             # or use cursor directly. DatabaseManager.execute_query works for now
             # but creates dictionary cursor. It's fine for DDL too (returns empty list).
             self.db.execute_query(query)
+            self.db.invalidate_schema()
             return {"message": f"Table {table_name} created successfully"}
         except Exception as e:
             raise Exception(f"Failed to create table: {str(e)}")
@@ -35,9 +58,14 @@ class SchemaManager:
     def list_tables(self):
         """List all tables in the database."""
         try:
-            results = self.db.execute_query("SHOW TABLES")
-            # results is [{'Tables_in_dbname': 'tablename'}, ...]
-            tables = [list(row.values())[0] for row in results]
+            # Indexed data-dictionary lookup; tuple rows avoid a dict per table
+            results = self.db.execute_prepared(
+                "SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME",
+                (self.db.config.DB_NAME,),
+                dictionary=False
+            )
+            # results is [('tablename',), ...]
+            tables = [row[0] for row in results]
             return tables
         except Exception as e:
             raise Exception(f"Failed to list tables: {str(e)}")
@@ -45,7 +73,8 @@ class SchemaManager:
     def delete_table(self, table_name):
         """Drop a table."""
         try:
-            self.db.execute_query(f"DROP TABLE IF EXISTS {table_name}")
+            self.db.execute_query(f"DROP TABLE IF EXISTS {_quote_identifier(table_name)}")
+            self.db.invalidate_schema()
             return {"message": f"Table {table_name} deleted successfully"}
         except Exception as e:
             raise Exception(f"Failed to delete table: {str(e)}")
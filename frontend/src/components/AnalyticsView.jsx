@@ -196,7 +196,7 @@ const AnalyticsView = ({ open, onOpenChange, filename, language }) => {
                                                 <Card key={name} className="overflow-hidden bg-card border-border">
                                                     <CardContent className="p-0">
                                                         <img
-                                                            src={`data:image/png;base64,${base64}`}
+                                                            src={`data:image/webp;base64,${base64}`}
                                                             alt={name}
                                                             className="w-full h-auto object-contain"
                                                         />